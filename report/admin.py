@@ -1,15 +1,15 @@
 import typing
 from urllib.parse import urlencode
 
-from django.conf import settings
 from django.contrib import admin, messages
+from django.db.models import F
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
 from .forms import TaskAdminForm, ReportAdminForm
-from . import gapi
-from .utils import build_report_pdf
+from . import gapi, tasks
 from .models import *
 
 
@@ -20,12 +20,6 @@ def make_link(href: str, title: str = None) -> str:
     )
 
 
-def build_report_name(report: Report) -> str:
-    return f'ООП_Отчёт_{report.task.number}' \
-           f'_{report.user.last_name}_{report.user.first_name}' \
-           f'_{report.user.student_groups.first().title}.pdf'
-
-
 @admin.register(GoogleApiFolder)
 class GoogleApiFolderAdmin(admin.ModelAdmin):
     list_display = 'title', 'api_id', 'link',
@@ -34,22 +28,47 @@ class GoogleApiFolderAdmin(admin.ModelAdmin):
         return make_link(gapi.build_folder_link(obj.api_id), 'Open')
 
 
+@admin.register(GoogleApiFile)
+class GoogleApiFileAdmin(admin.ModelAdmin):
+    list_display = 'name', 'parent_id', 'api_id', 'updated_at', 'link',
+    search_fields = 'name', 'parent_id', 'api_id',
+
+    def link(self, obj: GoogleApiFile) -> str:
+        return make_link(gapi.build_file_link(obj.api_id), 'Open')
+
+
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = 'title', 'link', 'users_count',
     filter_horizontal = 'users',
+    actions = 'refresh_sheet_layout',
 
     def link(self, obj: Group) -> typing.Optional[str]:
         if obj.folder:
             return make_link(gapi.build_folder_link(obj.folder.api_id))
         return None
 
+    def refresh_sheet_layout(self, request, queryset):
+        # layouts cached with previous versions are not used anymore
+        count = queryset.update(sheet_layout_version=F('sheet_layout_version') + 1)
+        self.message_user(request, f'Layouts of {count} groups will be reloaded from the result sheet',
+                          messages.SUCCESS)
+    refresh_sheet_layout.short_description = 'Reload deadlines and scores from the result sheet'
+
+
+class TaskSkeletonFileInline(admin.TabularInline):
+    model = TaskSkeletonFile
+    fields = 'file', 'digest',
+    readonly_fields = 'digest',
+    extra = 0
+
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     form = TaskAdminForm
     list_display = 'number', 'title', 'preview', 'enabled',
     list_display_links = 'title',
+    inlines = TaskSkeletonFileInline,
 
     def preview(self, obj: Report) -> str:
         return make_link(reverse('task', args=(obj.id,)), 'Open')
@@ -85,13 +104,15 @@ class StatusReportFilter(admin.SimpleListFilter):
 
 class SourceFileInline(admin.TabularInline):
     model = SourceFile
+    fields = 'name', 'file', 'size', 'lines_count', 'digest',
+    readonly_fields = 'size', 'lines_count', 'digest',
     extra = 0
 
 
 class ReportsSimilarityInline(admin.TabularInline):
     model = ReportsSimilarity
     fk_name = 'right'
-    readonly_fields = 'left', 'ratio', 'compare',
+    readonly_fields = 'left', 'ratio', 'approximate', 'compare',
     extra = 0
     can_delete = False
 
@@ -111,14 +132,15 @@ class ReportAdmin(admin.ModelAdmin):
 
     list_display = (
         'username', 'first_group', 'task', 'created_at',
-        'approved_at', 'rejected_at', 'comment', 'ratio', 'preview',
+        'approved_at', 'rejected_at', 'comment', 'ratio', 'publication', 'preview',
     )
     list_display_links = 'username',
     search_fields = 'user__last_name', 'user__first_name', 'task__title',
-    list_filter = 'task', FirstGroupFilter, StatusReportFilter,
-    readonly_fields = 'created_at',
+    list_filter = 'task', FirstGroupFilter, StatusReportFilter, 'publish_status',
+    readonly_fields = 'created_at', 'publish_status', 'publish_error',
     save_on_top = True
     inlines = ReportsSimilarityInline, SourceFileInline,
+    actions = 'approve_and_publish', 'approve_and_publish_without_score',
 
     def first_group(self, obj: Report) -> Group:
         return obj.user.student_groups.first()
@@ -143,35 +165,57 @@ class ReportAdmin(admin.ModelAdmin):
         value_repr = f'{value:0.3f}' if value else '-'
         return mark_safe(f'<p style="background-color: {self.ratio_color(value)}">{value_repr}</p>')
 
+    def publication_color(self, status: str) -> str:
+        return {
+            Report.PUBLISH_PENDING: '#fff98e',
+            Report.PUBLISH_DONE: '#a8e6a1',
+            Report.PUBLISH_FAILED: '#fb8989',
+        }.get(status, '')
+
+    def publication(self, obj: Report) -> str:
+        return format_html(
+            '<p style="background-color: {}" title="{}">{}</p>',
+            self.publication_color(obj.publish_status), obj.publish_error,
+            obj.get_publish_status_display() or '-'
+        )
+
+    def publish_reports(self, request, queryset, need_score: bool):
+        reports = list(queryset.select_related('report_file'))
+        now = timezone.now()
+        Report.objects.filter(id__in=[x.id for x in reports]).update(approved_at=now, rejected_at=None)
+        for report in reports:
+            report.approved_at, report.rejected_at = now, None
+
+        tasks.schedule_publication(reports, need_score)
+        self.message_user(
+            request,
+            f'{len(reports)} reports were approved, their publication is scheduled. '
+            f'Success or failure of every report is shown in the "publication" column '
+            f'(hover a failed report to see the error, filter reports by publish status)',
+            messages.SUCCESS
+        )
+
+    def approve_and_publish(self, request, queryset):
+        self.publish_reports(request, queryset, need_score=True)
+    approve_and_publish.short_description = 'Approve and publish selected reports'
+
+    def approve_and_publish_without_score(self, request, queryset):
+        self.publish_reports(request, queryset, need_score=False)
+    approve_and_publish_without_score.short_description = 'Approve and publish selected reports without score'
+
     def response_change(self, request, obj: Report):
         if '_approve' in request.POST or '_approve_without_score' in request.POST:
             obj.approved_at = timezone.now()
             obj.rejected_at = None
             obj.save()
 
-            try:
-                pdf_content = obj.report_file.file.read()
-                group = obj.user.student_groups.first()
-                if not group:
-                    raise RuntimeError(f'User "{obj.user.get_full_name()}" '
-                                       'is not associated with any group')
-                google_folder_name = f'{group.title}-Lab{obj.task.number:02}'
-
-                folder = GoogleApiFolder.objects.filter(title=google_folder_name).first()
-                if not folder:
-                    raise RuntimeError("GoogleApiFolder not found: report wasn't uploaded to Google Drive")
-
-                file_id = gapi.upload_file(folder.api_id, build_report_name(obj), pdf_content)
-                gapi.update_results(
-                    settings.GAPI_RESULT_SHEET, obj, gapi.build_file_link(file_id), '_approve' in request.POST
-                )
-
-            except Exception as ex:
-                messages.add_message(request, messages.WARNING, ex)
+            tasks.schedule_publication([obj], '_approve' in request.POST)
+            messages.add_message(request, messages.INFO, 'Publication of the report is scheduled')
 
         elif '_reject' in request.POST:
             obj.approved_at = None
             obj.rejected_at = timezone.now()
+            tasks.cancel_publication(obj)
             obj.save()
 
         return super().response_change(request, obj)
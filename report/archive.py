@@ -0,0 +1,57 @@
+# zip archives are built on the fly: nothing but the current chunk is kept in memory
+import typing
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+# already compressed files are stored as is
+STORED_EXTENSIONS = '.pdf', '.zip', '.png', '.jpg', '.jpeg',
+
+
+class StreamBuffer:
+    """
+    Unseekable file-like target of zipfile, written data is taken away by chunks
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_stream(entries: typing.Iterable[typing.Tuple[str, str]]) -> typing.Iterator[bytes]:
+    """
+    Zip archive of (name in archive, path on disk) entries yielded by chunks
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo.from_file(path, name)
+            if not name.lower().endswith(STORED_EXTENSIONS):
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            yield buffer.pop()
+    yield buffer.pop()
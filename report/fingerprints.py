@@ -0,0 +1,78 @@
+import functools
+import random
+import struct
+import typing
+import zlib
+
+WHITESPACE = b' \t\r\n\f\v'
+
+
+def strip_whitespace(content: bytes) -> bytes:
+    return content.translate(None, WHITESPACE)
+
+
+def line_fingerprint(line: str) -> int:
+    return zlib.crc32(strip_whitespace(line.encode()))
+
+
+def kgram_hashes(content: bytes, k: int) -> typing.List[int]:
+    return [zlib.crc32(content[i:i + k]) for i in range(len(content) - k + 1)]
+
+
+def winnow(content: bytes, k: int, window: int) -> typing.Set[int]:
+    """
+    Select document fingerprints by the winnowing algorithm:
+    the rightmost minimal k-gram hash of every window of hashes
+    """
+    hashes = kgram_hashes(strip_whitespace(content), k)
+    if len(hashes) <= window:
+        return {min(hashes)} if hashes else set()
+
+    selected = set()
+    min_idx = -1
+    for start in range(len(hashes) - window + 1):
+        end = start + window
+        if min_idx < start:
+            min_idx = start
+            for idx in range(start + 1, end):
+                if hashes[idx] <= hashes[min_idx]:
+                    min_idx = idx
+        elif hashes[end - 1] <= hashes[min_idx]:
+            min_idx = end - 1
+        selected.add(hashes[min_idx])
+
+    return selected
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+@functools.lru_cache()
+def minhash_permutations(count: int, seed: int = 42) -> typing.List[typing.Tuple[int, int]]:
+    rnd = random.Random(seed)
+    return [
+        (rnd.randint(1, MERSENNE_PRIME - 1), rnd.randint(0, MERSENNE_PRIME - 1))
+        for _ in range(count)
+    ]
+
+
+def minhash(values: typing.Set[int], count: int) -> typing.List[int]:
+    return [
+        min(((a * v + b) % MERSENNE_PRIME) & MAX_HASH for v in values)
+        for a, b in minhash_permutations(count)
+    ]
+
+
+def lsh_bands(signature: typing.List[int], bands: int) -> typing.List[int]:
+    rows = len(signature) // bands
+    return [
+        zlib.crc32(struct.pack(f'{rows}I', *signature[band * rows:(band + 1) * rows]))
+        for band in range(bands)
+    ]
+
+
+def estimate_jaccard(a: typing.List[int], b: typing.List[int]) -> float:
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
@@ -1,18 +1,26 @@
-import functools
 import io
 import re
+import threading
 import typing
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
 from django.utils import timezone
 from google.oauth2 import service_account
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.discovery import build
-from report.models import Report
+from report.models import GoogleApiFile, Group, Report
 
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# max count of requests in a batch request of Google Drive API
+DRIVE_BATCH_SIZE = 100
 
-class LazyServices:
+
+class LazyServices(threading.local):
+    # google api clients aren't thread-safe, so every thread builds its own
     def __init__(self):
         self._credentials = None
         self._drive = None
@@ -52,18 +60,106 @@ class LazyServices:
 services = LazyServices()
 
 
-def get_or_make_google_drive_folder(parent_folder_id: str, folder_name: str) -> str:
-    exists = services.drive.files().list(
-        fields='files(id)', q=f'name contains "{folder_name}" and "{parent_folder_id}" in parents'
-    ).execute()
-    if exists['files']:
-        return exists['files'][0]['id']
+def quote_query(value: str) -> str:
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{escaped}'"
+
 
-    return services.drive.files().create(body={
-        'name': folder_name,
-        'parents': [parent_folder_id],
-        'mimeType': 'application/vnd.google-apps.folder',
-    }).execute().get('id')
+def find_file(parent_id: str, name: str, mime_type: str = None) -> typing.Optional[str]:
+    """
+    Id of the file with exactly this name in the folder
+    """
+    query = f'name = {quote_query(name)} and {quote_query(parent_id)} in parents and trashed = false'
+    if mime_type:
+        query += f' and mimeType = {quote_query(mime_type)}'
+    exists = services.drive.files().list(fields='files(id)', q=query).execute()
+    return exists['files'][0]['id'] if exists['files'] else None
+
+
+def list_children(parent_id: str, mime_type: str = None) -> typing.List[dict]:
+    query = f'{quote_query(parent_id)} in parents and trashed = false'
+    if mime_type:
+        query += f' and mimeType = {quote_query(mime_type)}'
+
+    children, page_token = [], None
+    while True:
+        result = services.drive.files().list(
+            fields='nextPageToken, files(id, name)', q=query, pageSize=1000, pageToken=page_token
+        ).execute()
+        children.extend(result['files'])
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return children
+
+
+def index_file(parent_id: str, name: str, file_id: str) -> None:
+    GoogleApiFile.objects.update_or_create(parent_id=parent_id, name=name, defaults={
+        'api_id': file_id,
+    })
+
+
+def index_files(files: typing.Iterable[typing.Tuple[str, str, str]]) -> None:
+    """
+    Bulk upsert of (parent id, name, file id) into the files index
+    """
+    files = {(parent_id, name): file_id for parent_id, name, file_id in files}
+    indexed = {
+        (x.parent_id, x.name): x for x in GoogleApiFile.objects.filter(
+            parent_id__in={parent_id for parent_id, _ in files}, name__in={name for _, name in files}
+        )
+    }
+
+    changed = []
+    for key, file_id in files.items():
+        if key in indexed and indexed[key].api_id != file_id:
+            indexed[key].api_id = file_id
+            changed.append(indexed[key])
+    GoogleApiFile.objects.bulk_update(changed, ['api_id'])
+    GoogleApiFile.objects.bulk_create(
+        GoogleApiFile(parent_id=parent_id, name=name, api_id=file_id)
+        for (parent_id, name), file_id in files.items() if (parent_id, name) not in indexed
+    )
+
+
+def reconcile_file_index(parent_id: str) -> int:
+    """
+    Replace the indexed files of the folder by its actual children, returns count of children
+    """
+    children = {}
+    for x in list_children(parent_id):
+        children.setdefault(x['name'], x['id'])
+
+    GoogleApiFile.objects.filter(parent_id=parent_id).exclude(name__in=children).delete()
+    index_files((parent_id, name, file_id) for name, file_id in children.items())
+    return len(children)
+
+
+def create_folders(folders: typing.List[typing.Tuple[str, str]]) -> typing.Tuple[dict, dict]:
+    """
+    Create (parent id, name) folders by batch requests,
+    returns ids of created folders and errors of failed ones by (parent id, name)
+    """
+    created, errors = {}, {}
+
+    def callback(key: typing.Tuple[str, str]):
+        def store(request_id, response, exception):
+            if exception is not None:
+                errors[key] = exception
+            else:
+                created[key] = response['id']
+        return store
+
+    for start in range(0, len(folders), DRIVE_BATCH_SIZE):
+        batch = services.drive.new_batch_http_request()
+        for parent_id, name in folders[start:start + DRIVE_BATCH_SIZE]:
+            batch.add(services.drive.files().create(body={
+                'name': name,
+                'parents': [parent_id],
+                'mimeType': FOLDER_MIME_TYPE,
+            }, fields='id'), callback=callback((parent_id, name)))
+        batch.execute()
+
+    return created, errors
 
 
 def build_folder_link(object_id: str) -> str:
@@ -75,20 +171,32 @@ def build_file_link(object_id: str) -> str:
 
 
 def upload_file(folder_id: str, name: str, file: bytes) -> typing.Optional[str]:
-    media = MediaIoBaseUpload(io.BytesIO(file), mimetype='application/pdf', resumable=True)
-    exists = services.drive.files().list(
-        fields='files(id)', q=f'name contains "{name}" and "{folder_id}" in parents'
-    ).execute()
-    if exists['files']:
-        gfile = services.drive.files().update(
-            fileId=exists['files'][0]['id'],
-            media_body=media
-        ).execute()
-    else:
+    """
+    Create or update the file, ids of uploaded files are indexed to update them without search
+    """
+    def media():
+        return MediaIoBaseUpload(io.BytesIO(file), mimetype='application/pdf', resumable=True)
+
+    indexed = GoogleApiFile.objects.filter(parent_id=folder_id, name=name).first()
+    file_id = indexed.api_id if indexed else find_file(folder_id, name)
+
+    gfile = None
+    if file_id:
+        try:
+            gfile = services.drive.files().update(
+                fileId=file_id, media_body=media(), fields='id'
+            ).execute()
+        except HttpError as ex:
+            # the indexed file was deleted from Google Drive
+            if not indexed or ex.resp.status != 404:
+                raise
+    if not gfile:
         gfile = services.drive.files().create(
             body={'name': name, 'parents': [folder_id]},
-            media_body=media, fields='id'
+            media_body=media(), fields='id'
         ).execute()
+
+    index_file(folder_id, name, gfile['id'])
     return gfile.get('id')
 
 
@@ -102,43 +210,122 @@ def get_sheet_data(sheet_id: str, ranges: str) -> dict:
     return sheet['data'][0]
 
 
-def update_results(sheet_id: str, report: Report, file_url: str, need_score: bool = True) -> None:
-    group = report.user.student_groups.first().title
+# students are listed in column A from row 4, tasks are in row 2 from column C
+# with deadlines above them and max scores in row 3 two columns to the right
+STUDENTS_FIRST_ROW = 4
+TASKS_FIRST_COLUMN = 3
+LAYOUT_RANGES = 'A4:A50', 'C1:Y3',
 
-    get_data = functools.partial(get_sheet_data, sheet_id)
 
-    data = get_data(f'{group}!A4:A50')
-    row_idx = next((
-        idx for idx, c in enumerate(data['rowData'])
-        if c['values'][0].get('formattedValue', '').startswith(report.username)
-    ), None)
-    if row_idx is None:
-        raise RuntimeError(f'Student "{report.username}" not found in Google Sheet')
+class SheetLayout(typing.NamedTuple):
+    # (student name, row number)
+    students: typing.List[typing.Tuple[str, int]]
+    # (task title, column number)
+    tasks: typing.List[typing.Tuple[str, int]]
+    # column number of task: the first moment after the deadline
+    deadlines: typing.Dict[int, datetime]
+    # column number of task: max score
+    scores: typing.Dict[int, int]
+
+    def find_row(self, username: str) -> typing.Optional[int]:
+        return next((row for name, row in self.students if name.startswith(username)), None)
+
+    def find_column(self, task_number: str) -> typing.Optional[int]:
+        return next((col for title, col in self.tasks if title.endswith(task_number)), None)
+
+
+def cell(values: typing.List[typing.List[str]], row_idx: int, col_idx: int) -> str:
+    try:
+        return values[row_idx][col_idx]
+    except IndexError:
+        return ''
+
+
+def parse_deadline(value: str) -> typing.Optional[datetime]:
+    try:
+        deadline = datetime.strptime(value.split('-')[-1].strip(), '%d.%m.%Y')
+    except ValueError:
+        return None
+    return timezone.make_aware(deadline + timedelta(days=1))
+
 
-    row = data['startRow'] + row_idx + 1
+def parse_score(value: str) -> typing.Optional[int]:
+    match = re.search(r'(\d+)', value)
+    return int(match.group(0)) if match else None
 
-    data = get_data(f'{group}!C2:W2')
+
+def sheet_layout_key(sheet_id: str, group: str) -> str:
+    version = Group.objects.filter(title=group).values_list('sheet_layout_version', flat=True).first()
+    return f'gapi-sheet-layout:{sheet_id}:{group}:{version or 0}'
+
+
+def load_sheet_layout(sheet_id: str, group: str) -> SheetLayout:
+    """
+    Read positions of students and tasks, deadlines and max scores of the group by one request
+    """
+    value_ranges = services.sheets.spreadsheets().values().batchGet(
+        spreadsheetId=sheet_id, ranges=[f'{group}!{x}' for x in LAYOUT_RANGES]
+    ).execute()['valueRanges']
+    students, header = (x.get('values', []) for x in value_ranges)
+
+    layout = SheetLayout([], [], {}, {})
+    for idx, values in enumerate(students):
+        if values and values[0]:
+            layout.students.append((values[0], STUDENTS_FIRST_ROW + idx))
+
+    for idx, title in enumerate(header[1] if len(header) > 1 else []):
+        if not title:
+            continue
+        col = TASKS_FIRST_COLUMN + idx
+        layout.tasks.append((title, col))
+        layout.deadlines[col] = parse_deadline(cell(header, 0, idx))
+        layout.scores[col] = parse_score(cell(header, 2, idx + 2))
+
+    return layout
+
+
+def get_sheet_layout(sheet_id: str, group: str, refresh: bool = False) -> SheetLayout:
+    key = sheet_layout_key(sheet_id, group)
+    layout = None if refresh else cache.get(key)
+    if layout is None:
+        layout = load_sheet_layout(sheet_id, group)
+        cache.set(key, layout, settings.GAPI_LAYOUT_CACHE_TIMEOUT)
+    return layout
+
+
+def invalidate_sheet_layout(sheet_id: str, group: str) -> None:
+    """
+    Layouts cached by every process are dropped by the new version of the group
+    """
+    cache.delete(sheet_layout_key(sheet_id, group))
+    Group.objects.filter(title=group).update(sheet_layout_version=F('sheet_layout_version') + 1)
+
+
+def result_update(sheet_id: str, report: Report, file_url: str, need_score: bool = True) -> dict:
+    """
+    Data of values.batchUpdate writing the result of the report
+    """
+    group = report.user.student_groups.first().title
     task_number = str(report.task.number)
 
-    col_idx = next((
-        idx for idx, c in enumerate(data['rowData'][0]['values'])
-        if c.get('formattedValue', '').endswith(task_number)
-    ), None)
-    if col_idx is None:
-        raise RuntimeError(f'Task with number "{task_number}" not found in Google Sheet')
+    layout = get_sheet_layout(sheet_id, group)
+    if layout.find_row(report.username) is None or layout.find_column(task_number) is None:
+        # the sheet could be edited after the layout was cached
+        layout = get_sheet_layout(sheet_id, group, refresh=True)
+
+    row = layout.find_row(report.username)
+    if row is None:
+        raise RuntimeError(f'Student "{report.username}" not found in Google Sheet')
 
-    col = data['startColumn'] + col_idx + 1
+    col = layout.find_column(task_number)
+    if col is None:
+        raise RuntimeError(f'Task with number "{task_number}" not found in Google Sheet')
 
     if need_score:
-        data = get_data(f'{group}!R1C{col}')
-        deadline = timezone.make_aware(
-            datetime.strptime(
-                data['rowData'][0]['values'][0]['formattedValue'].split('-')[-1].strip(), '%d.%m.%Y'
-            ) + timedelta(days=1)
-        )
+        deadline, score = layout.deadlines[col], layout.scores[col]
+        if deadline is None or score is None:
+            raise RuntimeError(f'Deadline or max score of task "{task_number}" not found in Google Sheet')
 
-        data = get_data(f'{group}!R3C{col + 2}')
-        score = int(re.search(r'(\d+)', data['rowData'][0]['values'][0]['formattedValue']).group(0))
         if report.created_at >= deadline:
             offset = report.created_at - deadline
             score -= (offset.days // 14) + 1
@@ -150,12 +337,16 @@ def update_results(sheet_id: str, report: Report, file_url: str, need_score: boo
         ranges = f'{group}!R{row}C{col}:R{row}C{col + 1}'
         values = [[report.created_at.strftime('%d.%m.%Y'), file_url]]
 
+    return {
+        'range': ranges,
+        'majorDimension': 'ROWS',
+        'values': values,
+    }
+
+
+def write_results(sheet_id: str, data: typing.List[dict]) -> None:
     services.sheets.spreadsheets().values().batchUpdate(spreadsheetId=sheet_id, body={
         'valueInputOption': 'USER_ENTERED',
-        'data': [{
-            'range': ranges,
-            'majorDimension': 'ROWS',
-            'values': values,
-        }],
+        'data': data,
         'includeValuesInResponse': False,
     }).execute()
@@ -0,0 +1,85 @@
+import re
+import typing
+
+C_LIKE_KEYWORDS = {
+    # c++
+    'alignas', 'alignof', 'auto', 'bool', 'break', 'case', 'catch', 'char', 'class', 'const',
+    'constexpr', 'const_cast', 'continue', 'decltype', 'default', 'delete', 'do', 'double',
+    'dynamic_cast', 'else', 'enum', 'explicit', 'extern', 'false', 'float', 'for', 'friend',
+    'goto', 'if', 'inline', 'int', 'long', 'mutable', 'namespace', 'new', 'noexcept', 'nullptr',
+    'operator', 'override', 'private', 'protected', 'public', 'register', 'reinterpret_cast',
+    'return', 'short', 'signed', 'sizeof', 'static', 'static_assert', 'static_cast', 'struct',
+    'switch', 'template', 'this', 'throw', 'true', 'try', 'typedef', 'typeid', 'typename',
+    'union', 'unsigned', 'using', 'virtual', 'void', 'volatile', 'while', 'final',
+    # c#
+    'abstract', 'as', 'base', 'byte', 'checked', 'decimal', 'delegate', 'event', 'fixed',
+    'foreach', 'get', 'implicit', 'in', 'interface', 'internal', 'is', 'lock', 'null', 'object',
+    'out', 'params', 'readonly', 'ref', 'sbyte', 'sealed', 'set', 'stackalloc', 'string',
+    'uint', 'ulong', 'unchecked', 'unsafe', 'ushort', 'var', 'yield', 'async', 'await',
+    # java
+    'boolean', 'extends', 'finally', 'implements', 'import', 'instanceof', 'native', 'package',
+    'strictfp', 'super', 'synchronized', 'throws', 'transient',
+}
+
+PYTHON_KEYWORDS = {
+    'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break', 'class',
+    'continue', 'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global',
+    'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return',
+    'try', 'while', 'with', 'yield', 'self',
+}
+
+C_LIKE_TOKEN = re.compile(r'''
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+    |(?P<str>@?"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+    |(?P<num>\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>::|->|\+\+|--|<<=|>>=|&&|\|\||[-+*/%&|^!=<>]=|<<|>>|\S)
+''', re.VERBOSE | re.DOTALL)
+
+PYTHON_TOKEN = re.compile(r'''
+    (?P<skip>\s+|\#[^\n]*)
+    |(?P<str>[rbuf]{0,2}(?:"""(?:\\.|.)*?"""|\'\'\'(?:\\.|.)*?\'\'\'|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'))
+    |(?P<num>\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>\*\*=?|//=?|->|:=|[-+*/%&|^!=<>@]=|<<|>>|\S)
+''', re.VERBOSE | re.DOTALL | re.IGNORECASE)
+
+LANGUAGES = {
+    '.py': (PYTHON_TOKEN, PYTHON_KEYWORDS),
+}
+DEFAULT_LANGUAGE = C_LIKE_TOKEN, C_LIKE_KEYWORDS
+
+
+def lex(text: str, extension: str) -> typing.Iterator[typing.Tuple[int, str]]:
+    """
+    Normalized tokens of the source with their positions: comments and whitespace
+    are dropped, identifiers, numbers and strings are replaced by placeholders
+    """
+    pattern, keywords = LANGUAGES.get(extension.lower(), DEFAULT_LANGUAGE)
+
+    for match in pattern.finditer(text):
+        kind, value = match.lastgroup, match.group()
+        if kind == 'skip':
+            continue
+        elif kind == 'name':
+            yield match.start(), value if value in keywords else 'ID'
+        elif kind == 'num':
+            yield match.start(), 'NUM'
+        elif kind == 'str':
+            yield match.start(), 'STR'
+        else:
+            yield match.start(), value
+
+
+def tokenize_lines(text: str, extension: str) -> typing.List[str]:
+    """
+    Tokens of every line of the source joined by spaces (empty for lines without tokens),
+    a token spanning several lines belongs to the line where it starts
+    """
+    lines = [[] for _ in range(text.count('\n') + 1)]
+    line, position = 0, 0
+    for start, token in lex(text, extension):
+        line += text.count('\n', position, start)
+        position = start
+        lines[line].append(token)
+    return [' '.join(x) for x in lines]
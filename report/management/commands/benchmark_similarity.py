@@ -0,0 +1,354 @@
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import random
+import re
+import statistics
+import tempfile
+import time
+import typing
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from report import fingerprints, lexer, models, similarity, tasks, utils
+
+WORDS = 'sum', 'count', 'value', 'result', 'index', 'left', 'right', 'size', 'node', 'buffer',
+FUNCTIONS = 'max', 'min', 'abs', 'gcd', 'swap', 'solve', 'check',
+TEMPLATES = (
+    'int {a} = {b} + {n};',
+    '{a} = {a} * {n} - {b};',
+    '{a} += {f}({b}, {n});',
+    'for (int {c} = 0; {c} < {a}; {c}++) {{',
+    'while ({a} > {n}) {{',
+    'if ({a} > {b}) {{',
+    '}}',
+    'std::cout << {a} << std::endl;',
+    'return {a};',
+)
+IDENTIFIER = re.compile(r'\b[a-z]+\d+\b')
+
+
+class Corpus(typing.NamedTuple):
+    # every report is a list of (file name, content)
+    reports: typing.List[typing.List[typing.Tuple[str, str]]]
+    # index of the copied report for plagiarised reports
+    sources: typing.List[typing.Optional[int]]
+
+
+def random_line(rnd: random.Random, names: typing.List[str]) -> str:
+    a, b, c = rnd.sample(names, 3)
+    return rnd.choice(TEMPLATES).format(a=a, b=b, c=c, f=rnd.choice(FUNCTIONS), n=rnd.randint(0, 99))
+
+
+def random_file(rnd: random.Random, lines: int) -> str:
+    names = [f'{rnd.choice(WORDS)}{rnd.randint(0, 99)}' for _ in range(12)]
+    return '\n'.join(
+        ' ' * 4 * rnd.randint(0, 3) + random_line(rnd, names) for _ in range(lines)
+    )
+
+
+def mutate_file(rnd: random.Random, content: str, mutation: float) -> str:
+    """
+    Disguise a copied file: rename identifiers, reindent, delete and insert lines
+    """
+    renames = {}
+    content = IDENTIFIER.sub(
+        lambda m: renames.setdefault(m.group(), f'{rnd.choice(WORDS)}{rnd.randint(100, 999)}'),
+        content
+    )
+    names = list(renames.values()) or list(WORDS)
+    lines = []
+    for line in content.splitlines():
+        if rnd.random() < mutation:
+            continue
+        lines.append(' ' * 2 * rnd.randint(0, 4) + line.strip())
+        if rnd.random() < mutation and len(names) >= 3:
+            lines.append(random_line(rnd, names))
+    return '\n'.join(lines)
+
+
+def generate_corpus(reports: int, files: int, lines: int, plagiarism: float,
+                    mutation: float, seed: int) -> Corpus:
+    rnd = random.Random(seed)
+    corpus = Corpus([], [])
+    for _ in range(reports):
+        originals = [i for i, source in enumerate(corpus.sources) if source is None]
+        if originals and rnd.random() < plagiarism:
+            source = rnd.choice(originals)
+            corpus.reports.append([
+                (name, mutate_file(rnd, content, mutation))
+                for name, content in corpus.reports[source]
+            ])
+        else:
+            source = None
+            corpus.reports.append([
+                (f'main{i}.cpp', random_file(rnd, rnd.randint(lines // 2, lines * 3 // 2)))
+                for i in range(files)
+            ])
+        corpus.sources.append(source)
+    return corpus
+
+
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        # the best of repeated runs is the least noisy estimate
+        self.stages[name] = min(elapsed, self.stages.get(name, elapsed))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the similarity pipeline on a synthetic corpus of reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-r', '--reports',
+            type=int,
+            default=30,
+            help='provide reports count'
+        )
+        parser.add_argument(
+            '-f', '--files',
+            type=int,
+            default=3,
+            help='provide files count per report'
+        )
+        parser.add_argument(
+            '-l', '--lines',
+            type=int,
+            default=200,
+            help='provide average lines count per file'
+        )
+        parser.add_argument(
+            '-p', '--plagiarism',
+            type=float,
+            default=0.3,
+            help='provide share of reports copied from other reports'
+        )
+        parser.add_argument(
+            '--mutation',
+            type=float,
+            default=0.1,
+            help='provide share of lines deleted and inserted in copied files'
+        )
+        parser.add_argument(
+            '-s', '--seed',
+            type=int,
+            default=0,
+            help='provide seed of the corpus generator'
+        )
+        parser.add_argument(
+            '-m', '--mode',
+            choices=utils.SIMILARITY_MODES,
+            default=settings.SIMILARITY_MODE,
+            help='provide comparison mode'
+        )
+        parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            default=settings.SIMILARITY_WORKERS,
+            help='provide worker processes count'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1,
+            help='provide runs count of in-memory stages (the best time is kept)'
+        )
+        parser.add_argument(
+            '--db',
+            action='store_true',
+            default=False,
+            help='also run the pipeline end to end through the database (changes are rolled back)'
+        )
+        parser.add_argument(
+            '-o', '--output',
+            type=str,
+            help='provide path to save results as JSON'
+        )
+        parser.add_argument(
+            '-b', '--baseline',
+            type=str,
+            help='provide path to saved results to compare with'
+        )
+
+    def handle(self, output: str, baseline: str, **options):
+        params = {
+            key: options[key] for key in (
+                'reports', 'files', 'lines', 'plagiarism', 'mutation', 'seed', 'mode', 'workers'
+            )
+        }
+        corpus = generate_corpus(*(params[key] for key in (
+            'reports', 'files', 'lines', 'plagiarism', 'mutation', 'seed'
+        )))
+        self.stdout.write(f'Corpus: {len(corpus.reports)} reports, '
+                          f'{sum(map(len, corpus.reports))} files, '
+                          f'{sum(s is not None for s in corpus.sources)} plagiarised')
+
+        timer = Timer()
+        metrics = {}
+        for _ in range(max(1, options['repeat'])):
+            metrics = self.run_in_memory(corpus, params, timer)
+        if options['db']:
+            metrics.update(self.run_in_database(corpus, params, timer))
+
+        results = {'params': params, 'stages': timer.stages, 'metrics': metrics}
+        self.print_results(results, self.load_results(baseline) if baseline else None)
+
+        if output:
+            with open(output, 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results are saved to "{output}"')
+
+    def run_in_memory(self, corpus: Corpus, params: dict, timer: Timer) -> dict:
+        """
+        Stages of the similarity engine without the database
+        """
+        with timer.stage('normalize'):
+            normalized = [
+                [(name, utils.normalize_source(content.encode())) for name, content in files]
+                for files in corpus.reports
+            ]
+
+        with timer.stage('tokenize'):
+            tokens = [
+                [[x for x in lexer.tokenize_lines(content, '.cpp') if x] for _, content in files]
+                for files in normalized
+            ]
+
+        with timer.stage('fingerprint'):
+            values = [
+                set().union(*(
+                    fingerprints.winnow(content.encode(), settings.FINGERPRINT_KGRAM,
+                                        settings.FINGERPRINT_WINDOW)
+                    for _, content in files
+                ))
+                for files in normalized
+            ]
+
+        with timer.stage('minhash'):
+            for x in values:
+                fingerprints.minhash(x, settings.MINHASH_PERMUTATIONS)
+
+        files_id = itertools.count(1)
+        files = {
+            report_id: [
+                similarity.FileData(
+                    next(files_id), name,
+                    report_tokens[i] if params['mode'] == 'tokens' else content,
+                    hashlib.sha256(content.encode()).hexdigest()
+                )
+                for i, (name, content) in enumerate(report_files)
+            ]
+            for report_id, (report_files, report_tokens) in enumerate(zip(corpus.reports, tokens))
+        }
+        pairs = list(itertools.combinations(files, 2))
+
+        ratios = {}
+        with timer.stage('all_pairs'):
+            for chunk in similarity.ratio_all_pairs(
+                files, pairs, params['workers'], options=utils.similarity_options(params['mode'])
+            ):
+                for a, b, ratio_ab, ratio_ba, _ in chunk:
+                    ratios[a, b] = max(ratio_ab, ratio_ba)
+
+        copied = {(corpus.sources[b], b) for b in range(len(corpus.sources))
+                  if corpus.sources[b] is not None}
+        return {
+            'pairs': len(pairs),
+            'pairs_per_second': len(pairs) / timer.stages['all_pairs']
+            if timer.stages['all_pairs'] else 0.0,
+            'plagiarised_ratio': statistics.mean(
+                [ratio for pair, ratio in ratios.items() if pair in copied] or [0.0]
+            ),
+            'original_ratio': statistics.mean(
+                [ratio for pair, ratio in ratios.items() if pair not in copied] or [0.0]
+            ),
+        }
+
+    def run_in_database(self, corpus: Corpus, params: dict, timer: Timer) -> dict:
+        """
+        Upload, indexing and scoring stages through the ORM, nothing is kept afterwards
+        """
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+            suffix = utils.gen_pass(8)
+            # bulk_create doesn't send post_save, so the task pdf is not generated
+            models.Task.objects.bulk_create([
+                models.Task(number=0, title=f'benchmark {suffix}', description='benchmark')
+            ])
+            task = models.Task.objects.filter(title=f'benchmark {suffix}').latest('id')
+
+            reports = []
+            with timer.stage('db_upload'):
+                for i, report_files in enumerate(corpus.reports):
+                    user = User.objects.create(username=f'benchmark-{suffix}-{i}')
+                    report = models.Report.objects.create(task=task, user=user, solution_text='')
+                    for name, content in report_files:
+                        models.SourceFile.objects.create(
+                            report=report, file=ContentFile(content.encode(), name=name)
+                        )
+                    reports.append(report)
+
+            with timer.stage('db_check_uniqueness_task'):
+                for report in reports:
+                    tasks.check_uniqueness(report.id)
+
+            with timer.stage('db_check_uniqueness_command'):
+                call_command('check_uniqueness', task=[task.id], force=True,
+                             workers=params['workers'], stdout=io.StringIO())
+
+            copied = [(reports[source], reports[i]) for i, source in enumerate(corpus.sources)
+                      if source is not None]
+
+            with timer.stage('db_ratio_reports'):
+                for src, dst in copied:
+                    utils.ratio_reports(src, dst, params['mode'])
+
+            with timer.stage('db_match_files_by_ratio'):
+                for src, dst in copied:
+                    utils.match_files_by_ratio(src, dst, params['mode'])
+
+            # neighbours found by the indexes are the quality of candidates selection
+            found = sum(
+                models.ReportsSimilarity.objects.filter(left=src, right=dst).exists()
+                for src, dst in copied
+            )
+            transaction.set_rollback(True)
+
+        return {'db_copies_found': found / len(copied) if copied else 1.0}
+
+    @staticmethod
+    def load_results(path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Baseline "{path}" can\'t be loaded: {e}')
+
+    def print_results(self, results: dict, baseline: dict = None):
+        if baseline and baseline.get('params') != results['params']:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was measured with other params, results are not comparable'
+            ))
+
+        for section in 'stages', 'metrics':
+            self.stdout.write(f'{section.capitalize()}:')
+            for name, value in results[section].items():
+                line = f'  {name:<30}{value:>12.4f}'
+                old = (baseline or {}).get(section, {}).get(name)
+                if old:
+                    line += f'{old:>12.4f}{(value - old) / old:>+10.1%}'
+                self.stdout.write(line)
@@ -1,11 +1,126 @@
+import collections
+import heapq
+import itertools
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from report import models, tasks
+from django.db import transaction
+from report import models, similarity, utils
 
 
 class Command(BaseCommand):
-    help = 'Check and fill uniqueness of reports'
+    help = 'Check and fill uniqueness of reports computing all-pairs similarity per task'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-t', '--task',
+            type=int,
+            action='append',
+            dest='tasks',
+            help='provide task id to process (all tasks by default)'
+        )
+        parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            default=settings.SIMILARITY_WORKERS,
+            help='provide worker processes count'
+        )
+        parser.add_argument(
+            '-c', '--chunk_size',
+            type=int,
+            default=100,
+            help='provide pairs count sent to a worker at once'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            default=False,
+            help='recompute reports which already have similarity'
+        )
+
+    def handle(self, tasks: list, workers: int, chunk_size: int, force: bool, **options):
+        queryset = models.Task.objects.all()
+        if tasks:
+            queryset = queryset.filter(id__in=tasks)
+
+        for task in queryset:
+            self.process_task(task, workers, chunk_size, force)
+
+    def process_task(self, task: models.Task, workers: int, chunk_size: int, force: bool):
+        reports = list(models.Report.objects.filter(task=task).prefetch_related('source_files'))
+        pending = {r.id for r in reports if force or r.similarity_checked_at is None}
+
+        if not pending:
+            self.stdout.write(f'Task "{task}" was already processed')
+            return
+
+        skeleton = utils.task_skeleton(task.id)
+        files = {}
+        for report in reports:
+            utils.index_report_signature(report, utils.index_report_fingerprints(report))
+            files[report.id] = utils.source_files_data(report, skeleton=skeleton)
+
+        # pairs are ordered by the first report, so reports are completed one by one
+        pairs = [
+            (a.id, b.id) for a, b in itertools.combinations(reports, 2)
+            if a.user_id != b.user_id and (a.id in pending or b.id in pending)
+        ]
+        remaining = collections.Counter(x for pair in pairs for x in pair if x in pending)
+
+        created_at = {r.id: r.created_at for r in reports}
+        neighbours = collections.defaultdict(list)
+
+        def add_neighbour(left: int, right: int, ratio: float, approximate: bool):
+            if right in pending:
+                neighbours[right].append((ratio, created_at[left], left, approximate))
+
+        # reports without pairs (e.g. the only report of the task) are completed at once
+        completed = [x for x in pending if not remaining[x]]
+        self.store_neighbours(task, completed, neighbours)
+
+        started = time.monotonic()
+        done, processed = 0, len(completed)
+        for chunk in similarity.ratio_all_pairs(
+            files, pairs, workers, chunk_size, utils.similarity_options()
+        ):
+            completed = []
+            for a, b, ratio_ab, ratio_ba, approximate in chunk:
+                add_neighbour(a, b, ratio_ab, approximate)
+                add_neighbour(b, a, ratio_ba, approximate)
+                for x in a, b:
+                    if x in pending:
+                        remaining[x] -= 1
+                        if not remaining[x]:
+                            completed.append(x)
+            self.store_neighbours(task, completed, neighbours)
+
+            done += len(chunk)
+            processed += len(completed)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Task "{task}": {done}/{len(pairs)} pairs, {processed} reports '
+                              f'({done / elapsed if elapsed else 0:.1f} pairs/s)')
+
+        self.stdout.write(f'Task "{task}": {processed} reports were processed')
+
+    @staticmethod
+    @transaction.atomic
+    def store_neighbours(task: models.Task, report_ids: list, neighbours: dict):
+        """
+        Replace the best neighbours of completed reports and mark them as checked
+        """
+        if not report_ids:
+            return
 
-    def handle(self, **options):
-        for report_id in models.Report.objects.values_list('id', flat=True):
-            tasks.check_uniqueness(report_id)
-            self.stdout.write(f'Report {report_id} was processed')
+        # near-duplicates from other tasks are found by check_uniqueness task only
+        models.ReportsSimilarity.objects.filter(right_id__in=report_ids, left__task=task).delete()
+        models.ReportsSimilarity.objects.bulk_create(
+            models.ReportsSimilarity(
+                left_id=left, right_id=right, ratio=ratio, approximate=approximate
+            )
+            for right in report_ids
+            for ratio, _, left, approximate in heapq.nlargest(
+                settings.SIMILARITY_TOP_K, neighbours.pop(right, [])
+            )
+        )
+        utils.mark_similarity_checked(report_ids)
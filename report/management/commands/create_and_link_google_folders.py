@@ -1,3 +1,7 @@
+import functools
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.management.base import BaseCommand
 from report import gapi, models
 
@@ -33,6 +37,12 @@ class Command(BaseCommand):
             default='Lab{lab:02}',
             help='provide lab folder name pattern'
         )
+        parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            default=8,
+            help='provide threads count listing folders concurrently'
+        )
         parser.add_argument(
             '--clear',
             action='store_true',
@@ -41,30 +51,70 @@ class Command(BaseCommand):
         )
 
     def handle(self, root_folder_id: str, groups: int, labs: int,
-               group_pattern: str, lab_pattern: str, clear: bool, **options):
+               group_pattern: str, lab_pattern: str, workers: int, clear: bool, **options):
         if clear:
             self.stdout.write(f'Clearing old links are requested...')
             models.GoogleApiFolder.objects.all().delete()
             self.stdout.write(f'Clearing finished...')
 
-        for group in range(1, groups + 1):
-            group_name = group_pattern.format(group=group)
-            group_folder_id = gapi.get_or_make_google_drive_folder(
-                root_folder_id, group_name
+        group_names = [group_pattern.format(group=group) for group in range(1, groups + 1)]
+        lab_names = [lab_pattern.format(lab=lab) for lab in range(1, labs + 1)]
+
+        group_ids = self.provide_folders([root_folder_id], group_names, workers)
+        group_ids = {name: group_ids[root_folder_id, name]
+                     for name in group_names if (root_folder_id, name) in group_ids}
+        lab_ids = self.provide_folders(list(group_ids.values()), lab_names, workers)
+
+        folders = dict(group_ids)
+        for group_name, group_folder_id in group_ids.items():
+            for lab_name in lab_names:
+                if (group_folder_id, lab_name) in lab_ids:
+                    folders[f'{group_name}-{lab_name}'] = lab_ids[group_folder_id, lab_name]
+
+        self.link_folders(folders)
+        gapi.index_files(
+            [(root_folder_id, name, folder_id) for name, folder_id in group_ids.items()] +
+            [(parent_id, name, folder_id) for (parent_id, name), folder_id in lab_ids.items()]
+        )
+        self.stdout.write(f'{len(folders)} folders now exist and registered in admin')
+
+    def provide_folders(self, parent_ids: typing.List[str], names: typing.List[str],
+                        workers: int) -> typing.Dict[typing.Tuple[str, str], str]:
+        """
+        Ids of folders with the names in every parent, missing folders are created by batches
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            children = executor.map(
+                functools.partial(gapi.list_children, mime_type=gapi.FOLDER_MIME_TYPE), parent_ids
             )
-            models.GoogleApiFolder.objects.update_or_create(title=group_name, defaults={
-                'api_id': group_folder_id,
-            })
-            self.stdout.write(f'Folder "{group_name}" now exists and registered in admin')
+            existing = {
+                (parent_id, x['name']): x['id']
+                for parent_id, folders in zip(parent_ids, children) for x in folders
+            }
+
+        missing = [(parent_id, name) for parent_id in parent_ids for name in names
+                   if (parent_id, name) not in existing]
+        created, errors = gapi.create_folders(missing)
+        for (parent_id, name), ex in errors.items():
+            self.stderr.write(f'Folder "{name}" in "{parent_id}" is not created: {ex}')
 
-            for lab in range(1, labs + 1):
-                lab_name = lab_pattern.format(lab=lab)
-                lab_folder_id = gapi.get_or_make_google_drive_folder(
-                    group_folder_id, lab_name
-                )
-                models.GoogleApiFolder.objects.update_or_create(
-                    title=f'{group_name}-{lab_name}',
-                    defaults={'api_id': lab_folder_id}
-                )
-                self.stdout.write(f'Folder "{group_name}/{lab_name}" now exists '
-                                  'and registered in admin')
+        self.stdout.write(f'{len(parent_ids) * len(names) - len(missing)} folders exist, '
+                          f'{len(created)} folders are created')
+        return {**existing, **created}
+
+    def link_folders(self, folders: typing.Dict[str, str]):
+        """
+        Bulk upsert of GoogleApiFolder by titles
+        """
+        linked = {x.title: x for x in models.GoogleApiFolder.objects.filter(title__in=folders)}
+
+        changed = []
+        for title, folder_id in folders.items():
+            if title in linked and linked[title].api_id != folder_id:
+                linked[title].api_id = folder_id
+                changed.append(linked[title])
+        models.GoogleApiFolder.objects.bulk_update(changed, ['api_id'])
+        models.GoogleApiFolder.objects.bulk_create(
+            models.GoogleApiFolder(title=title, api_id=folder_id)
+            for title, folder_id in folders.items() if title not in linked
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from report import archive, models, utils
+
+
+class Command(BaseCommand):
+    help = 'Export pdf and source files of reports to zip archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            type=str,
+            help='provide path of zip archive'
+        )
+        parser.add_argument(
+            '-t', '--task',
+            type=int,
+            help='provide task id'
+        )
+        parser.add_argument(
+            '-g', '--group',
+            type=str,
+            help='provide group title'
+        )
+        parser.add_argument(
+            '-s', '--status',
+            choices=models.Report.statuses().keys(),
+            help='provide status of reports'
+        )
+
+    def handle(self, output: str, task: int, group: str, status: str, **options):
+        reports = utils.filter_reports(task, group, status)
+        self.stdout.write(f'Exporting {reports.count()} reports...')
+
+        size = 0
+        with open(output, 'wb') as f:
+            for chunk in archive.zip_stream(utils.export_entries(reports)):
+                f.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(f'Archive "{output}" of {size / 2 ** 20:.1f} MB is saved')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from report import gapi, models
+
+
+class Command(BaseCommand):
+    help = 'Reconcile index of Google Drive files with actual content of folders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--parent',
+            type=str,
+            action='append',
+            dest='parents',
+            help='provide Google Drive folder id (all linked and indexed folders by default)'
+        )
+
+    def handle(self, parents: list, **options):
+        if not parents:
+            parents = sorted(
+                set(models.GoogleApiFolder.objects.values_list('api_id', flat=True)) |
+                set(models.GoogleApiFile.objects.values_list('parent_id', flat=True))
+            )
+
+        for parent_id in parents:
+            try:
+                count = gapi.reconcile_file_index(parent_id)
+                self.stdout.write(f'Folder "{parent_id}": {count} files are indexed')
+            except Exception as ex:
+                self.stderr.write(f'Folder "{parent_id}": {ex}')
@@ -67,6 +67,7 @@ class Command(BaseCommand):
                     students.append(student.id)
 
                 group.users.set(students)
+                gapi.invalidate_sheet_layout(settings.GAPI_RESULT_SHEET, group_name)
 
                 self.stdout.write(f'Finished scanning group "{group_name}"')
 
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0004_reportssimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceFileFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(verbose_name='Value')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='report.report', verbose_name='Report')),
+                ('source_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='report.sourcefile', verbose_name='Source file')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='report.task', verbose_name='Task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='sourcefilefingerprint',
+            index=models.Index(fields=['task', 'value'], name='report_sour_task_id_ae2c98_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0005_sourcefilefingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcefile',
+            name='digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Content SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='sourcefile',
+            name='lines_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Lines count'),
+        ),
+        migrations.AddField(
+            model_name='sourcefile',
+            name='normalized',
+            field=models.TextField(blank=True, verbose_name='Normalized content'),
+        ),
+        migrations.AddField(
+            model_name='sourcefile',
+            name='size',
+            field=models.PositiveIntegerField(default=0, verbose_name='Size in bytes'),
+        ),
+    ]
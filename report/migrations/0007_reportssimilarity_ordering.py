@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0006_sourcefile_cache'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='reportssimilarity',
+            options={'ordering': ('-ratio',)},
+        ),
+    ]
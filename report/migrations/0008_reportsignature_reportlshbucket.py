@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0007_reportssimilarity_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSignature',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minhash', models.JSONField(verbose_name='MinHash signature')),
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='signature', to='report.report', verbose_name='Report')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportLshBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Band')),
+                ('key', models.BigIntegerField(verbose_name='Key')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='report.report', verbose_name='Report')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reportlshbucket',
+            index=models.Index(fields=['band', 'key'], name='report_repo_band_3f2522_idx'),
+        ),
+    ]
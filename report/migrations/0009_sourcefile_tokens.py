@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0008_reportsignature_reportlshbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcefile',
+            name='tokens',
+            field=models.TextField(blank=True, verbose_name='Normalized tokens'),
+        ),
+    ]
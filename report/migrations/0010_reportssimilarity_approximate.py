@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0009_sourcefile_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportssimilarity',
+            name='approximate',
+            field=models.BooleanField(default=False, verbose_name='Approximate'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:34
+
+import os
+
+from django.db import migrations, models
+import report.models
+
+
+def fill_names(apps, schema_editor):
+    SourceFile = apps.get_model('report', 'SourceFile')
+    for f in SourceFile.objects.filter(name='').only('id', 'file'):
+        f.name = os.path.basename(f.file.name)
+        f.save(update_fields=('name',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0010_reportssimilarity_approximate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcefile',
+            name='name',
+            field=models.CharField(blank=True, max_length=256, verbose_name='Name'),
+        ),
+        migrations.AlterField(
+            model_name='sourcefile',
+            name='file',
+            field=models.FileField(max_length=256, storage=report.models.ContentAddressedStorage(), upload_to=report.models.source_blob_path, verbose_name='Source file'),
+        ),
+        migrations.RunPython(fill_names, migrations.RunPython.noop),
+    ]
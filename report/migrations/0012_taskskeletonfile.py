@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import report.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0011_sourcefile_content_addressed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSkeletonFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(max_length=256, upload_to=report.models.task_skeleton_file_path, verbose_name='Skeleton file')),
+                ('digest', models.CharField(blank=True, max_length=64, verbose_name='Content SHA-256')),
+                ('lines', models.JSONField(blank=True, default=list, verbose_name='Fingerprints of lines')),
+                ('fingerprints', models.JSONField(blank=True, default=list, verbose_name='Fingerprints')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skeleton_files', to='report.task', verbose_name='Task')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0012_taskskeletonfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskfile',
+            name='html_digest',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Rendered HTML SHA-256'),
+        ),
+    ]
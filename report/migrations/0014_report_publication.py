@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0013_taskfile_html_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='drive_file_id',
+            field=models.CharField(blank=True, editable=False, max_length=128, verbose_name='Google drive file ID'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='publish_error',
+            field=models.TextField(blank=True, editable=False, verbose_name='Publication error'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='publish_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Publication key'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='publish_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('published', 'Published'), ('failed', 'Failed')], editable=False, max_length=16, verbose_name='Publication status'),
+        ),
+    ]
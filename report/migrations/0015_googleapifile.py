@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0014_report_publication'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleApiFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parent_id', models.CharField(max_length=128, verbose_name='Google drive parent folder ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Name')),
+                ('api_id', models.CharField(max_length=128, verbose_name='Google drive file ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+            ],
+            options={
+                'ordering': ('parent_id', 'name'),
+                'unique_together': {('parent_id', 'name')},
+            },
+        ),
+    ]
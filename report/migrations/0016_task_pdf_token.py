@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0015_googleapifile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='pdf_token',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='PDF generation token'),
+        ),
+    ]
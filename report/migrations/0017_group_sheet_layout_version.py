@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0016_task_pdf_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='sheet_layout_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Sheet layout version'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0017_group_sheet_layout_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcefile',
+            name='text',
+            field=models.TextField(blank=True, verbose_name='Decoded content'),
+        ),
+    ]
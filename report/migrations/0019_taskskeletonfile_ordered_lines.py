@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+def reset_digests(apps, schema_editor):
+    # skeleton files without digest are filled again with lines in order when they are loaded
+    TaskSkeletonFile = apps.get_model('report', 'TaskSkeletonFile')
+    TaskSkeletonFile.objects.update(digest='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0018_sourcefile_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskskeletonfile',
+            name='lines',
+            field=models.JSONField(blank=True, default=list, verbose_name='Fingerprints of lines in order'),
+        ),
+        migrations.RunPython(reset_digests, migrations.RunPython.noop),
+    ]
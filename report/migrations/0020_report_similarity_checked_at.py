@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:06
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_checked(apps, schema_editor):
+    # reports with stored similarity were checked before
+    Report = apps.get_model('report', 'Report')
+    ReportsSimilarity = apps.get_model('report', 'ReportsSimilarity')
+    Report.objects.filter(
+        id__in=ReportsSimilarity.objects.values('right_id')
+    ).update(similarity_checked_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0019_taskskeletonfile_ordered_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='similarity_checked_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Similarity checked at'),
+        ),
+        migrations.RunPython(mark_checked, migrations.RunPython.noop),
+    ]
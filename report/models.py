@@ -1,6 +1,9 @@
+import os
+import tempfile
 from collections import OrderedDict
 
 from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.db.models import QuerySet
 from django.urls import reverse
@@ -18,6 +21,20 @@ class GoogleApiFolder(models.Model):
         return self.title
 
 
+class GoogleApiFile(models.Model):
+    parent_id = models.CharField(verbose_name='Google drive parent folder ID', max_length=128)
+    name = models.CharField(verbose_name='Name', max_length=256)
+    api_id = models.CharField(verbose_name='Google drive file ID', max_length=128)
+    updated_at = models.DateTimeField(verbose_name='Updated at', auto_now=True)
+
+    class Meta:
+        unique_together = 'parent_id', 'name',
+        ordering = 'parent_id', 'name',
+
+    def __str__(self) -> str:
+        return self.name
+
+
 class Group(models.Model):
     title = models.CharField(verbose_name='Title', max_length=32, db_index=True)
     folder = models.ForeignKey(
@@ -26,6 +43,9 @@ class Group(models.Model):
     )
     users = models.ManyToManyField(User, related_name='student_groups',
                                    verbose_name='Users', blank=True)
+    # cached layouts of the group tab in the result sheet are keyed by the version
+    sheet_layout_version = models.PositiveIntegerField(verbose_name='Sheet layout version',
+                                                       default=0, editable=False)
 
     class Meta:
         ordering = 'title',
@@ -43,6 +63,9 @@ class Task(models.Model):
     title = models.CharField(verbose_name='Title', max_length=128)
     description = models.TextField(verbose_name='Description')
     enabled = models.BooleanField(verbose_name='Enabled', default=True)
+    # only the latest scheduled generation of the pdf is run
+    pdf_token = models.CharField(verbose_name='PDF generation token', max_length=32,
+                                 blank=True, editable=False)
 
     @property
     def name(self) -> str:
@@ -72,9 +95,27 @@ class TaskFile(models.Model):
                                 verbose_name='Task', related_name='task_file')
     file = models.FileField(verbose_name='Task file', max_length=256,
                             upload_to=task_file_path)
+    html_digest = models.CharField(verbose_name='Rendered HTML SHA-256', max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Created at')
 
 
+def task_skeleton_file_path(skeleton_file: 'TaskSkeletonFile', filename: str) -> str:
+    return f'tasks/skeletons/{skeleton_file.task.name}/{filename}'
+
+
+class TaskSkeletonFile(models.Model):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE,
+                             verbose_name='Task', related_name='skeleton_files')
+    file = models.FileField(verbose_name='Skeleton file', max_length=256,
+                            upload_to=task_skeleton_file_path)
+    digest = models.CharField(verbose_name='Content SHA-256', max_length=64, blank=True)
+    lines = models.JSONField(verbose_name='Fingerprints of lines in order', default=list, blank=True)
+    fingerprints = models.JSONField(verbose_name='Fingerprints', default=list, blank=True)
+
+    def __str__(self) -> str:
+        return f'{os.path.basename(self.file.name)} | {self.task}'
+
+
 def queryset_approved(queryset):
     return queryset.filter(approved_at__isnull=False)
 
@@ -104,6 +145,15 @@ class VerifyingReportManager(models.Manager):
 
 
 class Report(models.Model):
+    PUBLISH_PENDING = 'pending'
+    PUBLISH_DONE = 'published'
+    PUBLISH_FAILED = 'failed'
+    PUBLISH_STATUSES = (
+        (PUBLISH_PENDING, 'Pending'),
+        (PUBLISH_DONE, 'Published'),
+        (PUBLISH_FAILED, 'Failed'),
+    )
+
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              verbose_name='User')
@@ -114,6 +164,17 @@ class Report(models.Model):
     rejected_at = models.DateTimeField(verbose_name='Rejected at',
                                        null=True, blank=True, db_index=True)
     comment = models.TextField(verbose_name='Comment', null=True, blank=True)
+    publish_status = models.CharField(verbose_name='Publication status', max_length=16,
+                                      choices=PUBLISH_STATUSES, blank=True, editable=False)
+    publish_error = models.TextField(verbose_name='Publication error', blank=True, editable=False)
+    # publication tasks with other keys are outdated, retries of the same one are skipped when done
+    publish_key = models.CharField(verbose_name='Publication key', max_length=64,
+                                   blank=True, editable=False)
+    drive_file_id = models.CharField(verbose_name='Google drive file ID', max_length=128,
+                                     blank=True, editable=False)
+    # reports without similar reports are checked too
+    similarity_checked_at = models.DateTimeField(verbose_name='Similarity checked at',
+                                                 null=True, blank=True, editable=False)
 
     objects = models.Manager()
     approved_objects = ApprovedReportManager()
@@ -187,14 +248,56 @@ def source_report_path(file: 'SourceFile', filename: str) -> str:
     )
 
 
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Storage for files named by their content hash: a file is written only once,
+    saving of the same content returns the existing name
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # concurrent uploads of the same content replace the file atomically
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+            for chunk in content.chunks():
+                tmp.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(tmp.name, self.file_permissions_mode)
+        os.replace(tmp.name, full_path)
+
+        return name
+
+
+def source_blob_path(file: 'SourceFile', filename: str) -> str:
+    ext = os.path.splitext(filename)[-1].lower()
+    return f'sources/blobs/{file.digest[:2]}/{file.digest}{ext}'
+
+
 class SourceFile(models.Model):
     file = models.FileField(verbose_name='Source file', max_length=256,
-                            upload_to=source_report_path)
+                            upload_to=source_blob_path, storage=ContentAddressedStorage())
+    name = models.CharField(verbose_name='Name', max_length=256, blank=True)
     report = models.ForeignKey(Report, on_delete=models.CASCADE,
                                related_name='source_files', verbose_name='Report')
+    digest = models.CharField(verbose_name='Content SHA-256', max_length=64,
+                              blank=True, db_index=True)
+    size = models.PositiveIntegerField(verbose_name='Size in bytes', default=0)
+    lines_count = models.PositiveIntegerField(verbose_name='Lines count', default=0)
+    text = models.TextField(verbose_name='Decoded content', blank=True)
+    normalized = models.TextField(verbose_name='Normalized content', blank=True)
+    # tokens of every line of the normalized content
+    tokens = models.TextField(verbose_name='Normalized tokens', blank=True)
 
     def __str__(self) -> str:
-        return f'{self.file.path} | {self.report}'
+        return f'{self.name} | {self.report}'
 
 
 class ReportsSimilarity(models.Model):
@@ -203,6 +306,52 @@ class ReportsSimilarity(models.Model):
     right = models.ForeignKey(Report, on_delete=models.CASCADE,
                               related_name='similarity_right', verbose_name='Right')
     ratio = models.FloatField(verbose_name='Ratio')
+    approximate = models.BooleanField(verbose_name='Approximate', default=False)
+
+    class Meta:
+        ordering = '-ratio',
 
     def __str__(self) -> str:
         return f'{self.left} <-> {self.right} | {self.ratio}'
+
+
+class SourceFileFingerprint(models.Model):
+    source_file = models.ForeignKey(SourceFile, on_delete=models.CASCADE,
+                                    related_name='fingerprints', verbose_name='Source file')
+    report = models.ForeignKey(Report, on_delete=models.CASCADE,
+                               related_name='fingerprints', verbose_name='Report')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE,
+                             related_name='fingerprints', verbose_name='Task')
+    value = models.BigIntegerField(verbose_name='Value')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'value']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.value} | {self.source_file}'
+
+
+class ReportSignature(models.Model):
+    report = models.OneToOneField(Report, on_delete=models.CASCADE,
+                                  related_name='signature', verbose_name='Report')
+    minhash = models.JSONField(verbose_name='MinHash signature')
+
+    def __str__(self) -> str:
+        return str(self.report)
+
+
+class ReportLshBucket(models.Model):
+    report = models.ForeignKey(Report, on_delete=models.CASCADE,
+                               related_name='lsh_buckets', verbose_name='Report')
+    band = models.PositiveSmallIntegerField(verbose_name='Band')
+    key = models.BigIntegerField(verbose_name='Key')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'key']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.band}:{self.key} | {self.report}'
@@ -1,9 +1,9 @@
 import os
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 
-from report import tasks
+from report import tasks, utils
 from report.models import *
 
 
@@ -23,6 +23,23 @@ def auto_delete_report_file_on_delete(sender, instance: ReportFile, **kwargs):
     remove_file(instance)
 
 
+@receiver(post_delete, sender=TaskSkeletonFile, dispatch_uid='delete_task_skeleton_file')
+def auto_delete_task_skeleton_file_on_delete(sender, instance: TaskSkeletonFile, **kwargs):
+    remove_file(instance)
+
+
+@receiver(pre_save, sender=TaskSkeletonFile, dispatch_uid='fill_skeleton_file_cache')
+def fill_skeleton_file_cache(sender, instance: TaskSkeletonFile, **kwargs):
+    if not instance.digest or not instance.file._committed:
+        utils.fill_skeleton_file_cache(instance)
+
+
+@receiver(pre_save, sender=SourceFile, dispatch_uid='fill_source_file_cache')
+def fill_source_file_cache(sender, instance: SourceFile, **kwargs):
+    if not instance.digest or not instance.file._committed:
+        utils.fill_source_file_cache(instance)
+
+
 @receiver(post_save, sender=Task, dispatch_uid='generate_task_pdf')
 def generate_task_pdf(sender, instance: Task, **kwargs):
-    tasks.generate_task_pdf.delay(instance.id)
+    tasks.schedule_task_pdf(instance.id)
@@ -0,0 +1,127 @@
+# fonts, stylesheets and templates are loaded once per process and reused by every document
+import functools
+import logging
+import mimetypes
+import os
+import time
+import typing
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.template.loader import get_template
+from django.utils._os import safe_join
+from weasyprint import CSS, HTML, default_url_fetcher
+
+try:
+    from weasyprint.text.fonts import FontConfiguration
+except ImportError:  # weasyprint < 53
+    from weasyprint.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+# templates of pdf documents and their static stylesheets
+PDF_TEMPLATES = {
+    'report/pdf_report_template.html': ('report/pdf_report.css',),
+    'report/pdf_task_template.html': (),
+}
+
+_font_config = None
+_stylesheets = {}
+
+
+def font_config() -> FontConfiguration:
+    global _font_config
+    if _font_config is None:
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def stylesheet(path: str) -> CSS:
+    if path not in _stylesheets:
+        _stylesheets[path] = CSS(filename=finders.find(path), font_config=font_config())
+    return _stylesheets[path]
+
+
+def local_asset_path(url: str) -> typing.Optional[str]:
+    """
+    Path on disk of media or static file served by the site itself
+    """
+    parsed, base = urlsplit(url), urlsplit(settings.BASE_URL)
+    if (parsed.scheme, parsed.netloc) != (base.scheme, base.netloc):
+        return None
+
+    for prefix, root in ((settings.MEDIA_URL, settings.MEDIA_ROOT),
+                         (settings.STATIC_URL, settings.STATIC_ROOT)):
+        if not parsed.path.startswith(prefix):
+            continue
+        relative = unquote(parsed.path[len(prefix):])
+        try:
+            path = safe_join(root, relative)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path) and prefix == settings.STATIC_URL:
+            # static files may be not collected yet
+            path = finders.find(relative) or path
+        return path if os.path.isfile(path) else None
+    return None
+
+
+@functools.lru_cache(maxsize=settings.PDF_ASSETS_CACHE_SIZE)
+def read_asset(path: str, mtime: int) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def url_fetcher(url: str, *args, **kwargs) -> dict:
+    """
+    Read own media and static files from disk (cached while they are not modified),
+    other urls are fetched by weasyprint
+    """
+    path = local_asset_path(url)
+    if path is None:
+        return default_url_fetcher(url, *args, **kwargs)
+
+    return {
+        'string': read_asset(path, os.stat(path).st_mtime_ns),
+        'mime_type': mimetypes.guess_type(path)[0],
+        'redirected_url': url,
+        'filename': os.path.basename(path),
+    }
+
+
+def warm_up() -> None:
+    """
+    Preload fonts, stylesheets and compiled templates of pdf documents
+    """
+    started = time.perf_counter()
+    for template, stylesheets in PDF_TEMPLATES.items():
+        get_template(template)
+        for path in stylesheets:
+            stylesheet(path)
+    logger.info('PDF renderer is warmed up in %.3fs', time.perf_counter() - started)
+
+
+def render_pdf(html: str, stylesheets: typing.Iterable[str] = (), **kwargs) -> bytes:
+    started = time.perf_counter()
+    kwargs.setdefault('url_fetcher', url_fetcher)
+    document = HTML(string=html, **kwargs).render(
+        stylesheets=[stylesheet(x) for x in stylesheets], font_config=font_config()
+    )
+    content = document.write_pdf()
+    logger.info('PDF of %d pages (%d bytes) is rendered in %.3fs',
+                len(document.pages), len(content), time.perf_counter() - started)
+    return content
+
+
+def render_html(template: str, context: dict) -> str:
+    return get_template(template).render(context)
+
+
+def render_pdf_template(template: str, context: dict, **kwargs) -> bytes:
+    started = time.perf_counter()
+    html = render_html(template, context)
+    content = render_pdf(html, PDF_TEMPLATES.get(template, ()), **kwargs)
+    logger.info('PDF "%s" is built in %.3fs', template, time.perf_counter() - started)
+    return content
@@ -0,0 +1,107 @@
+import os
+import re
+import typing
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+BYTES_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header: str, size: int) -> typing.Optional[typing.Tuple[int, int]]:
+    """
+    Single bytes range as (start, end) inclusive, ValueError for unsatisfiable ranges.
+    Multiple or malformed ranges are ignored (None)
+    """
+    match = BYTES_RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path: str, start: int, length: int) -> typing.Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(FileResponse.block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def if_range_matches(request: HttpRequest, etag: str, mtime: int) -> bool:
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == mtime
+
+
+def stream_file(request: HttpRequest, path: str, size: int, mtime: int, etag: str,
+                content_type: str) -> HttpResponse:
+    header = request.META.get('HTTP_RANGE')
+    if not header or not if_range_matches(request, etag, mtime):
+        header = ''
+    try:
+        bytes_range = parse_range(header, size) if header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if bytes_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = bytes_range
+    response = StreamingHttpResponse(
+        read_range(path, start, end - start + 1), status=206, content_type=content_type
+    )
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve_file(request: HttpRequest, file: typing.Optional[FieldFile],
+               content_type: str = 'application/pdf') -> HttpResponse:
+    """
+    Serve the file with validators and conditional requests support.
+    The transfer is given to nginx in 'nginx' serving mode, otherwise it is streamed
+    by django with range requests support
+    """
+    try:
+        stat = os.stat(file.path)
+    except (AttributeError, ValueError, OSError):
+        raise Http404()
+
+    mtime = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        if settings.FILES_SERVING == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.NGINX_PROTECTED_URL + quote(file.name)
+        else:
+            response = stream_file(request, file.path, stat.st_size, mtime, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    # files are regenerated under the same url, so they are revalidated every time
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,337 @@
+# works with plain data only (no ORM objects) to be runnable in worker processes
+import difflib as df
+import functools
+import multiprocessing
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import billiard
+
+from report import fingerprints
+
+
+# rough speed of SequenceMatcher.find_longest_match in pairs of equal items per second
+MATCH_STEPS_PER_SECOND = 4_000_000
+
+
+class FileData(typing.NamedTuple):
+    id: int
+    name: str
+    # text or sequence of lines of tokens
+    content: typing.Sequence
+    # hash of the original content: files with the same digest are identical
+    digest: str = ''
+
+
+class MatchOptions(typing.NamedTuple):
+    # pairs of files which can't reach the cutoff are scored as 0 without full comparison
+    cutoff: float = 0.0
+    # junk heuristic of SequenceMatcher keeps comparison of long texts near linear,
+    # it must be disabled for sequences of few distinct symbols
+    autojunk: bool = True
+    # files longer than this (in items of content: chars of text or lines of tokens)
+    # are compared approximately by fingerprints (0 means no limit)
+    max_exact_size: int = 0
+    # seconds for an exact comparison, then files are compared approximately,
+    # and for an approximate comparison, the rest of files is not fingerprinted (0 means no limit)
+    time_budget: float = 0.0
+    kgram: int = 20
+    window: int = 10
+
+
+class FileMatch(typing.NamedTuple):
+    ratio: float
+    left: int
+    right: int
+    approximate: bool = False
+
+
+class PairRatio(typing.NamedTuple):
+    # ratio of a against b weighted by sizes of a
+    forward: float
+    # ratio of b against a weighted by sizes of b
+    backward: float
+    approximate: bool = False
+
+
+def length_ratio_bound(a: typing.Sequence, b: typing.Sequence) -> float:
+    total = len(a) + len(b)
+    return 2.0 * min(len(a), len(b)) / total if total else 1.0
+
+
+def ratio_with_budget(matcher: df.SequenceMatcher, time_budget: float = 0.0) -> typing.Optional[float]:
+    """
+    Same as matcher.ratio() but None when the time budget is spent (0 means no limit).
+    The budget is checked between searches of the longest matches, so a comparison
+    which can't finish even the first search in time is not started
+    """
+    deadline = time.monotonic() + time_budget if time_budget else None
+    if deadline:
+        steps = sum(len(matcher.b2j.get(x, ())) for x in matcher.a)
+        if steps > time_budget * MATCH_STEPS_PER_SECOND:
+            return None
+
+    la, lb = len(matcher.a), len(matcher.b)
+    matches, queue = 0, [(0, la, 0, lb)]
+    while queue:
+        if deadline and time.monotonic() > deadline:
+            return None
+        alo, ahi, blo, bhi = queue.pop()
+        i, j, k = matcher.find_longest_match(alo, ahi, blo, bhi)
+        if k:
+            matches += k
+            if alo < i and blo < j:
+                queue.append((alo, i, blo, j))
+            if i + k < ahi and j + k < bhi:
+                queue.append((i + k, ahi, j + k, bhi))
+    return 2.0 * matches / (la + lb) if la + lb else 1.0
+
+
+def ratio_with_cutoff(matcher: df.SequenceMatcher, cutoff: float,
+                      time_budget: float = 0.0) -> typing.Optional[float]:
+    if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+        return 0.0
+    return ratio_with_budget(matcher, time_budget)
+
+
+def is_huge(content: typing.Sequence, options: MatchOptions) -> bool:
+    return bool(options.max_exact_size) and len(content) > options.max_exact_size
+
+
+def as_bytes(content: typing.Sequence) -> bytes:
+    return (content if isinstance(content, str) else '\n'.join(content)).encode()
+
+
+def approximate_ratio(a: typing.Sequence, b: typing.Sequence, options: MatchOptions) -> float:
+    """
+    Dice coefficient of winnowing fingerprints, linear instead of quadratic SequenceMatcher.
+    Both contents are fingerprinted by proportional chunks until the time budget is spent
+    """
+    started = time.monotonic()
+    # chunks are proportional to the limit of exact comparison in items of content
+    longest = max(len(a), len(b))
+    steps = max(1, -(-longest // (options.max_exact_size or max(longest, 1))))
+
+    a, b = as_bytes(a), as_bytes(b)
+    a_prints, b_prints = set(), set()
+    for step in range(steps):
+        for data, prints in ((a, a_prints), (b, b_prints)):
+            chunk = data[len(data) * step // steps:len(data) * (step + 1) // steps]
+            prints |= fingerprints.winnow(chunk, options.kgram, options.window)
+        if options.time_budget and time.monotonic() - started > options.time_budget:
+            break
+
+    total = len(a_prints) + len(b_prints)
+    return 2.0 * len(a_prints & b_prints) / total if total else 1.0
+
+
+def compare_files(f1: FileData, f2: FileData, options: MatchOptions,
+                  matcher: df.SequenceMatcher = None) -> typing.Tuple[float, bool]:
+    """
+    Ratio of files and whether it was calculated approximately: files are compared
+    by fingerprints when they are huge or their exact comparison exceeds the time budget.
+    Matcher with f2 content already set as the second sequence can be reused
+    """
+    if f1.digest and f1.digest == f2.digest:
+        return 1.0, False
+
+    if is_huge(f1.content, options) or is_huge(f2.content, options):
+        return approximate_ratio(f1.content, f2.content, options), True
+
+    if length_ratio_bound(f1.content, f2.content) < options.cutoff:
+        return 0.0, False
+
+    if matcher is None:
+        matcher = df.SequenceMatcher(None, autojunk=options.autojunk)
+        matcher.set_seq2(f2.content)
+    matcher.set_seq1(f1.content)
+    ratio = ratio_with_cutoff(matcher, options.cutoff, options.time_budget)
+    if ratio is None:
+        return approximate_ratio(f1.content, f2.content, options), True
+    return ratio, False
+
+
+def assign(weights: typing.List[typing.List[float]]) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Hungarian algorithm: pairs (row, col) maximizing total weight,
+    min(rows, cols) pairs are returned
+    """
+    if not weights or not weights[0]:
+        return []
+
+    transposed = len(weights) > len(weights[0])
+    if transposed:
+        weights = [list(col) for col in zip(*weights)]
+
+    n, m = len(weights), len(weights[0])
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    p, way = [0] * (m + 1), [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        min_v = [float('inf')] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], float('inf'), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = -weights[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < min_v[j]:
+                        min_v[j], way[j] = cur, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if not p[j0]:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return pairs
+
+
+def match_files(src_files: typing.List[FileData], dst_files: typing.List[FileData],
+                options: MatchOptions = MatchOptions()) -> typing.List[FileMatch]:
+    """
+    Match files of reports: files with the same names are paired first,
+    the rest are paired by the assignment maximizing the sum of ratios
+    """
+    matched = []
+
+    same_names = []
+    for f1 in src_files:
+        f2 = next((f for f in dst_files if f.name == f1.name), None)  # TODO: make with distance
+        if f2:
+            # the cutoff is not applied to files with the same names
+            same_names.append((*compare_files(f1, f2, options._replace(cutoff=0.0)), f1, f2))
+
+    used_src, used_dst = set(), set()
+    for ratio, approximate, f1, f2 in sorted(same_names, key=lambda x: x[0], reverse=True):
+        if f1.id not in used_src and f2.id not in used_dst:
+            used_src.add(f1.id)
+            used_dst.add(f2.id)
+            matched.append((True, FileMatch(ratio, f1.id, f2.id, approximate)))
+
+    rest_src = [f for f in src_files if f.id not in used_src]
+    rest_dst = [f for f in dst_files if f.id not in used_dst]
+
+    weights = [[(0.0, False)] * len(rest_dst) for _ in rest_src]
+    for col, f2 in enumerate(rest_dst):
+        matcher = df.SequenceMatcher(None, autojunk=options.autojunk)
+        matcher.set_seq2(f2.content)
+        for row, f1 in enumerate(rest_src):
+            weights[row][col] = compare_files(f1, f2, options, matcher)
+
+    for row, col in assign([[ratio for ratio, _ in x] for x in weights]):
+        ratio, approximate = weights[row][col]
+        matched.append((False, FileMatch(ratio, rest_src[row].id, rest_dst[col].id, approximate)))
+
+    matched.sort(key=lambda x: (x[0], x[1].ratio), reverse=True)
+    return [x for _, x in matched]
+
+
+def weighted_ratio(matched_files: typing.List[FileMatch], sizes: typing.Dict[int, int]) -> float:
+    total = sum(sizes[x.left] for x in matched_files)
+    if not total:
+        return 0.0
+    return sum(x.ratio * sizes[x.left] for x in matched_files) / total
+
+
+def ratio_files(src_files: typing.List[FileData], dst_files: typing.List[FileData],
+                options: MatchOptions = MatchOptions()) -> float:
+    sizes = {f.id: len(f.content) for f in src_files}
+    return weighted_ratio(match_files(src_files, dst_files, options), sizes)
+
+
+def ratio_pair(a_files: typing.List[FileData], b_files: typing.List[FileData],
+               options: MatchOptions = MatchOptions()) -> PairRatio:
+    """
+    Match files of both reports once and return ratios in both directions
+    """
+    matched_files = match_files(a_files, b_files, options)
+    sizes = {f.id: len(f.content) for f in a_files + b_files}
+    return PairRatio(
+        weighted_ratio(matched_files, sizes),
+        weighted_ratio([x._replace(left=x.right, right=x.left) for x in matched_files], sizes),
+        any(x.approximate for x in matched_files),
+    )
+
+
+def map_in_processes(func: typing.Callable, items: typing.Iterable, workers: int,
+                     initializer: typing.Callable = None, initargs: tuple = ()) -> typing.Iterator:
+    """
+    Map items by func in a pool of worker processes keeping the order of items.
+    Daemonic processes (e.g. prefork workers of celery) can't have children
+    of multiprocessing, so billiard pool is used in them
+    """
+    if multiprocessing.current_process().daemon:
+        with billiard.Pool(workers, initializer, initargs) as pool:
+            yield from pool.imap(func, items)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=initargs) as executor:
+        yield from executor.map(func, items)
+
+
+def ratio_many(srcs_files: typing.List[typing.List[FileData]], dst_files: typing.List[FileData],
+               workers: int = 1,
+               options: MatchOptions = MatchOptions()) -> typing.List[PairRatio]:
+    """
+    Calculate ratios of every src and dst in both directions keeping the order of srcs.
+    With workers > 1 comparisons are spread across a process pool
+    """
+    compare = functools.partial(ratio_pair, b_files=dst_files, options=options)
+    workers = min(workers, len(srcs_files))
+    if workers <= 1:
+        return list(map(compare, srcs_files))
+
+    return list(map_in_processes(compare, srcs_files, workers))
+
+
+_shared_files = {}
+_shared_options = MatchOptions()
+
+
+def _share_files(files: typing.Dict[int, typing.List[FileData]], options: MatchOptions) -> None:
+    global _shared_files, _shared_options
+    _shared_files, _shared_options = files, options
+
+
+def _ratio_pairs_chunk(pairs: typing.List[typing.Tuple[int, int]]) -> list:
+    return [
+        (a, b, *ratio_pair(_shared_files[a], _shared_files[b], _shared_options))
+        for a, b in pairs
+    ]
+
+
+def ratio_all_pairs(files: typing.Dict[int, typing.List[FileData]],
+                    pairs: typing.List[typing.Tuple[int, int]],
+                    workers: int = 1, chunk_size: int = 100,
+                    options: MatchOptions = MatchOptions()) -> typing.Iterator[list]:
+    """
+    Score every (a, b) pair once, yielding results by chunks as
+    (a, b, ratio of a against b, ratio of b against a, approximate).
+    Files are sent to every worker process once
+    """
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        _share_files(files, options)
+        yield from map(_ratio_pairs_chunk, chunks)
+        return
+
+    yield from map_in_processes(_ratio_pairs_chunk, chunks, min(workers, len(chunks)),
+                                _share_files, (files, options))
@@ -1,29 +1,62 @@
-from celery import shared_task
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app, shared_task
+from celery.signals import worker_process_init
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, transaction
 from django.core.files.base import ContentFile
 
-from report import utils
+from report import gapi, rendering, similarity, utils
 from report.models import *
 
 logger = get_task_logger(__name__)
 
 
+@worker_process_init.connect
+def warm_up_pdf_renderer(**kwargs):
+    # queues selected by -Q option of the worker are inherited by its processes
+    if settings.PDF_QUEUE in current_app.amqp.queues.consume_from:
+        rendering.warm_up()
+
+
+def schedule_task_pdf(task_id: int) -> None:
+    """
+    Generate pdf after the debounce delay, only the latest of scheduled generations is run
+    """
+    token = utils.gen_pass()
+    # update doesn't send post_save, so the task is not scheduled again
+    Task.objects.filter(id=task_id).update(pdf_token=token)
+    generate_task_pdf.apply_async((task_id, token), countdown=settings.TASK_PDF_DEBOUNCE)
+
+
 @shared_task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
              default_retry_delay=10)
-def generate_task_pdf(task_id: int):
+def generate_task_pdf(task_id: int, token: str = None):
     logger.info('Started')
     task = Task.objects.filter(id=task_id).first()
 
     if not task:
         return
 
+    if token and task.pdf_token and token != task.pdf_token:
+        logger.info('Skipped: superseded by a later save')
+        return
+
+    html_digest = utils.task_html_digest(task)
+    task_file = getattr(task, 'task_file', None)
+    if task_file and task_file.html_digest == html_digest:
+        logger.info('Skipped: content is not changed')
+        return
+
     pdf_content = utils.build_task_pdf(task, base_url=settings.BASE_URL)
     file_data = ContentFile(pdf_content, name=f'{task.name}.pdf')
 
-    if getattr(task, 'task_file', None):
-        task.task_file.delete()
-    TaskFile.objects.create(task=task, file=file_data)
+    if task_file:
+        task_file.delete()
+    TaskFile.objects.create(task=task, file=file_data, html_digest=html_digest)
 
     logger.info('Successfully finished')
 
@@ -55,18 +88,152 @@ def check_uniqueness(report_id: int):
     if not report:
         return
 
-    other_reports = list(Report.objects.exclude().filter(
-        task_id=report.task_id
-    ).exclude(user=report.user).prefetch_related('source_files'))
+    values = utils.index_report_fingerprints(report)
+    signature = utils.index_report_signature(report, values)
+    other_reports = utils.find_candidate_reports(
+        report, values, settings.SIMILARITY_CANDIDATES
+    ) + utils.find_near_duplicate_reports(report, signature, settings.SIMILARITY_CANDIDATES)
     if not other_reports:
+        utils.mark_similarity_checked([report.id])
+        logger.info('Finished: no similar reports')
         return
 
-    ratio, _, other_report = max(map(
-        lambda x: (utils.ratio_reports(x, report), x.created_at, x), other_reports
-    ))
+    ratios = similarity.ratio_many(
+        [utils.source_files_data(x) for x in other_reports],
+        utils.source_files_data(report),
+        workers=settings.SIMILARITY_WORKERS,
+        options=utils.similarity_options()
+    )
+    neighbours = sorted(
+        zip(ratios, other_reports), key=lambda x: (x[0].forward, x[1].created_at), reverse=True
+    )
+    utils.store_similarity(
+        report.id,
+        [(x.forward, other_report.id, x.approximate) for x, other_report in neighbours],
+        [(x.backward, other_report.id, x.approximate) for x, other_report in neighbours]
+    )
+
+    logger.info('Successfully finished')
+
 
-    ReportsSimilarity.objects.get_or_create(left=other_report, right=report, defaults={
-        'ratio': ratio
-    })
+# errors of data which are not fixed by retries
+PERMANENT_PUBLISH_ERRORS = RuntimeError, ObjectDoesNotExist,
+
+
+def schedule_publication(reports: typing.List[Report], need_score: bool) -> None:
+    """
+    Mark approved reports as pending and publish them after the transaction is committed
+    """
+    for report in reports:
+        report.publish_key = utils.publication_key(report, need_score)
+        report.publish_status, report.publish_error, report.drive_file_id = Report.PUBLISH_PENDING, '', ''
+    Report.objects.bulk_update(
+        reports, ['publish_key', 'publish_status', 'publish_error', 'drive_file_id']
+    )
+
+    args = [x.id for x in reports], [x.publish_key for x in reports], need_score
+    transaction.on_commit(lambda: publish_reports.delay(*args))
+
+
+def cancel_publication(report: Report) -> None:
+    """
+    Forget the scheduled publication of the rejected report, so it is skipped by the task
+    """
+    report.publish_key, report.publish_status, report.publish_error = '', '', ''
+
+
+def set_publish_status(report: Report, status: str, error: str = '') -> None:
+    Report.objects.filter(id=report.id, publish_key=report.publish_key).update(
+        publish_status=status, publish_error=error
+    )
+
+
+def upload_report_file(report: Report, folder_id: str, name: str) -> str:
+    try:
+        return utils.upload_report_file(report, folder_id, name)
+    finally:
+        # the uploading thread has its own database connection for the files index
+        connections.close_all()
+
+
+@shared_task(bind=True, max_retries=settings.PUBLISH_MAX_RETRIES)
+def publish_reports(self, report_ids: typing.List[int], keys: typing.List[str], need_score: bool = True):
+    """
+    Upload pdf files of reports to Google Drive concurrently and write their results by one request.
+    Failed reports are retried with exponential backoff, reports with other publication keys
+    (approved again since), rejected or already published ones are skipped
+    """
+    logger.info('Started')
+    keys = dict(zip(report_ids, keys))
+    reports = [
+        x for x in Report.objects.filter(
+            id__in=report_ids, approved_at__isnull=False
+        ).select_related('task', 'user', 'report_file')
+        if x.publish_key == keys[x.id] and x.publish_status != Report.PUBLISH_DONE
+    ]
+
+    failed, jobs = [], []
+    for report in reports:
+        if report.drive_file_id:
+            continue
+        try:
+            jobs.append((report, utils.report_folder_id(report), utils.build_report_name(report)))
+        except Exception as ex:
+            failed.append((report, ex))
+
+    with ThreadPoolExecutor(max_workers=settings.GAPI_UPLOAD_WORKERS) as executor:
+        uploads = [(job[0], executor.submit(upload_report_file, *job)) for job in jobs]
+
+    for report, upload in uploads:
+        try:
+            report.drive_file_id = upload.result()
+        except Exception as ex:
+            failed.append((report, ex))
+            continue
+        # the file is not uploaded again by retries
+        Report.objects.filter(id=report.id, publish_key=report.publish_key).update(
+            drive_file_id=report.drive_file_id
+        )
+
+    published, data = [], []
+    for report in reports:
+        if not report.drive_file_id:
+            continue
+        try:
+            data.append(gapi.result_update(
+                settings.GAPI_RESULT_SHEET, report, gapi.build_file_link(report.drive_file_id), need_score
+            ))
+            published.append(report)
+        except Exception as ex:
+            failed.append((report, ex))
+
+    if data:
+        try:
+            gapi.write_results(settings.GAPI_RESULT_SHEET, data)
+        except Exception as ex:
+            failed.extend((report, ex) for report in published)
+            published = []
+
+    for report in published:
+        set_publish_status(report, Report.PUBLISH_DONE)
+
+    retried = []
+    for report, ex in failed:
+        logger.warning(f'Report {report.id} is not published: {ex}')
+        if isinstance(ex, PERMANENT_PUBLISH_ERRORS) or self.request.retries >= self.max_retries:
+            set_publish_status(report, Report.PUBLISH_FAILED, str(ex))
+        else:
+            set_publish_status(report, Report.PUBLISH_PENDING, str(ex))
+            retried.append(report)
+
+    if retried:
+        raise self.retry(
+            args=([x.id for x in retried], [x.publish_key for x in retried], need_score),
+            countdown=settings.PUBLISH_RETRY_DELAY * 2 ** self.request.retries
+        )
 
     logger.info('Successfully finished')
+    return {
+        'published': [x.id for x in published],
+        'failed': {x.id: str(ex) for x, ex in failed},
+    }
@@ -1,3 +1,623 @@
-from django.test import TestCase
+import difflib as df
+import io
+import itertools
+import os
+import random
+import tempfile
+import types
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import billiard
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from report import archive, fingerprints, gapi, lexer, serving, similarity, tasks, utils
+from report.admin import ReportAdmin
+from report.models import Group, Report, ReportsSimilarity, SourceFile, Task
+
+
+class ReportsTestCase(TestCase):
+    """
+    Reports with source files stored in a temporary media root
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # pdf of a task is generated by celery workers
+        patcher = mock.patch('report.tasks.schedule_task_pdf')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.task = Task.objects.create(number=1, title='Task', description='Task')
+
+    def create_report(self, username: str, files: dict, task: Task = None) -> Report:
+        user = User.objects.create_user(username, password=username)
+        report = Report.objects.create(task=task or self.task, user=user, solution_text='')
+        for name, content in files.items():
+            SourceFile.objects.create(report=report, file=ContentFile(content.encode(), name=name))
+        return report
+
+
+class AssignTestCase(SimpleTestCase):
+    @staticmethod
+    def brute_force(weights):
+        rows, cols = len(weights), len(weights[0])
+        if rows <= cols:
+            return max(
+                sum(weights[row][col] for row, col in enumerate(perm))
+                for perm in itertools.permutations(range(cols), rows)
+            )
+        return max(
+            sum(weights[row][col] for col, row in enumerate(perm))
+            for perm in itertools.permutations(range(rows), cols)
+        )
+
+    def test_empty(self):
+        self.assertEqual(similarity.assign([]), [])
+        self.assertEqual(similarity.assign([[]]), [])
+
+    def test_prefers_total_weight_over_greedy(self):
+        # greedy choice of 0.9 gives 0.9 + 0.0, the optimum is 0.8 + 0.8
+        self.assertEqual(sorted(similarity.assign([[0.9, 0.8], [0.8, 0.0]])), [(0, 1), (1, 0)])
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(0)
+        for rows, cols in itertools.product(range(1, 5), repeat=2):
+            for _ in range(10):
+                weights = [[round(rnd.random(), 2) for _ in range(cols)] for _ in range(rows)]
+                pairs = similarity.assign(weights)
+
+                self.assertEqual(len(pairs), min(rows, cols))
+                self.assertEqual(len({row for row, _ in pairs}), len(pairs))
+                self.assertEqual(len({col for _, col in pairs}), len(pairs))
+                self.assertAlmostEqual(
+                    sum(weights[row][col] for row, col in pairs), self.brute_force(weights)
+                )
+
+
+class WinnowTestCase(SimpleTestCase):
+    content = b'int main() {\n    int sum = 0;\n    for (int i = 0; i < 10; i++) sum += i;\n}\n'
+
+    def test_winnow_selects_kgram_hashes(self):
+        selected = fingerprints.winnow(self.content, 5, 4)
+        hashes = fingerprints.kgram_hashes(fingerprints.strip_whitespace(self.content), 5)
+
+        self.assertTrue(selected)
+        self.assertLessEqual(selected, set(hashes))
+        # every window of hashes contains a selected hash
+        for start in range(len(hashes) - 4 + 1):
+            self.assertTrue(selected & set(hashes[start:start + 4]))
+
+    def test_winnow_ignores_whitespace(self):
+        reindented = self.content.replace(b'    ', b'\t').replace(b' ', b'')
+        self.assertEqual(fingerprints.winnow(self.content, 5, 4),
+                         fingerprints.winnow(reindented, 5, 4))
+
+    def test_winnow_short_content(self):
+        self.assertEqual(fingerprints.winnow(b'abc', 5, 4), set())
+        self.assertEqual(len(fingerprints.winnow(b'abcdef', 5, 4)), 1)
+
+
+class LshBandsTestCase(SimpleTestCase):
+    content = b'int main() {\n    int sum = 0;\n    for (int i = 0; i < 10; i++) sum += i;\n}\n'
+
+    def test_lsh_bands(self):
+        signature = fingerprints.minhash(fingerprints.winnow(self.content, 5, 4), 32)
+        bands = fingerprints.lsh_bands(signature, 8)
+
+        self.assertEqual(len(bands), 8)
+        self.assertEqual(bands, fingerprints.lsh_bands(list(signature), 8))
+
+        # a changed row changes only its own band
+        changed = signature[:]
+        changed[5] ^= 1
+        self.assertEqual(
+            [x != y for x, y in zip(bands, fingerprints.lsh_bands(changed, 8))],
+            [False, True] + [False] * 6
+        )
+
+
+class LexerTestCase(SimpleTestCase):
+    def test_tokenize_lines(self):
+        text = 'int a = 1; // one\n/* two\n lines */\nreturn a;'
+        self.assertEqual(
+            lexer.tokenize_lines(text, '.cpp'), ['int ID = NUM ;', '', '', 'return ID ;']
+        )
+
+
+class RatioTestCase(SimpleTestCase):
+    def test_ratio_with_budget_is_ratio(self):
+        rnd = random.Random(0)
+        for _ in range(50):
+            a = ''.join(rnd.choice('abc\n ') for _ in range(rnd.randint(0, 200)))
+            b = ''.join(rnd.choice('abc\n ') for _ in range(rnd.randint(0, 200)))
+            matcher = df.SequenceMatcher(None, a, b)
+            self.assertAlmostEqual(similarity.ratio_with_budget(matcher), matcher.ratio())
+
+    def test_spent_budget_is_approximate(self):
+        rnd = random.Random(0)
+        a, b = ([str(rnd.randint(0, 9)) for _ in range(5000)] for _ in range(2))
+        options = similarity.MatchOptions(autojunk=False, time_budget=1e-6)
+        _, approximate = similarity.compare_files(
+            similarity.FileData(1, 'a', a), similarity.FileData(2, 'b', b), options
+        )
+        self.assertTrue(approximate)
+
+
+class ParseRangeTestCase(SimpleTestCase):
+    def test_ranges(self):
+        for header, expected in (
+            ('bytes=0-99', (0, 99)),
+            ('bytes=10-', (10, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=-200', (0, 99)),
+            ('bytes=90-200', (90, 99)),
+            (' bytes=0-0 ', (0, 0)),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(serving.parse_range(header, 100), expected)
+
+    def test_ignored(self):
+        for header in 'bytes=-', 'bytes=0-1,5-6', 'items=0-1', 'bytes=a-b':
+            with self.subTest(header=header):
+                self.assertIsNone(serving.parse_range(header, 100))
+
+    def test_unsatisfiable(self):
+        for header, size in ('bytes=100-', 100), ('bytes=5-1', 100), ('bytes=0-', 0):
+            with self.subTest(header=header, size=size):
+                with self.assertRaises(ValueError):
+                    serving.parse_range(header, size)
+
+
+@override_settings(FILES_SERVING='django')
+class ServeFileTestCase(SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.content)
+        self.addCleanup(os.remove, path)
+        self.file = types.SimpleNamespace(path=path, name=os.path.basename(path))
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        return serving.serve_file(self.factory.get('/', **headers), self.file)
+
+    def test_full(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response = self.serve(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_suffix_range(self):
+        response = self.serve(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_outdated_if_range(self):
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_missing_file(self):
+        with self.assertRaises(Http404):
+            serving.serve_file(self.factory.get('/'), None)
+
+
+class ZipStreamTestCase(SimpleTestCase):
+    def test_round_trip(self):
+        rnd = random.Random(0)
+        contents = {
+            'report/main.cpp': b'int main() {}\n' * 1000,
+            'report/report.pdf': bytes(rnd.getrandbits(8) for _ in range(3 * archive.CHUNK_SIZE)),
+            'empty.txt': b'',
+        }
+        with tempfile.TemporaryDirectory() as root:
+            entries = []
+            for i, (name, content) in enumerate(contents.items()):
+                path = os.path.join(root, str(i))
+                with open(path, 'wb') as f:
+                    f.write(content)
+                entries.append((name, path))
+
+            data = b''.join(archive.zip_stream(entries))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as result:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.namelist(), list(contents))
+            for name, content in contents.items():
+                self.assertEqual(result.read(name), content)
+            self.assertEqual(result.getinfo('report/main.cpp').compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(result.getinfo('report/report.pdf').compress_type, zipfile.ZIP_STORED)
+
+
+def ratio_many_in_worker(files):
+    return similarity.ratio_many(files[:-1], files[-1], workers=2)
+
+
+class RatioManyTestCase(SimpleTestCase):
+    files = [
+        [similarity.FileData(i, 'main.cpp', f'int value = {i};\n' * (i + 5))] for i in range(4)
+    ]
+
+    def test_in_daemonic_process(self):
+        # prefork workers of celery are daemonic
+        with billiard.Pool(1) as pool:
+            ratios = pool.apply(ratio_many_in_worker, (self.files,))
+        self.assertEqual(ratios, similarity.ratio_many(self.files[:-1], self.files[-1]))
+
+    def test_processes(self):
+        self.assertEqual(similarity.ratio_many(self.files[:-1], self.files[-1], workers=2),
+                         similarity.ratio_many(self.files[:-1], self.files[-1]))
+
+
+class CheckUniquenessTaskTestCase(ReportsTestCase):
+    source = '\n'.join(f'int value{i} = {i} * {i};' for i in range(30))
+
+    @override_settings(SIMILARITY_WORKERS=2)
+    def test_workers_in_daemonic_process(self):
+        original = self.create_report('original', {'main.cpp': self.source})
+        self.create_report('other', {'main.cpp': 'int main() { return 0; }'})
+        tasks.check_uniqueness(original.id)
+        copy = self.create_report('copy', {'main.cpp': self.source + '\n// copied'})
+
+        with mock.patch('multiprocessing.current_process', return_value=mock.Mock(daemon=True)):
+            tasks.check_uniqueness(copy.id)
+
+        similar = ReportsSimilarity.objects.get(left=original, right=copy)
+        self.assertGreater(similar.ratio, 0.9)
+        self.assertTrue(ReportsSimilarity.objects.filter(left=copy, right=original).exists())
+        copy.refresh_from_db()
+        self.assertIsNotNone(copy.similarity_checked_at)
+
+
+class CompareReportsTestCase(ReportsTestCase):
+    def test_file_names_are_escaped(self):
+        name = '<img src=x onerror=alert(1)>.cpp'
+        src = self.create_report('src', {name: 'int a = 1;'})
+        dst = self.create_report('dst', {'main.cpp': 'int b = 1;'})
+        self.assertNotIn('<', src.source_files.get().name)
+
+        # names saved before they were sanitized
+        SourceFile.objects.filter(report=src).update(name=name)
+        for _, diff in utils.compare_reports(src, dst):
+            self.assertNotIn('<img', diff)
+            self.assertIn('&lt;img', diff)
+
+
+class PublishReportsTestCase(ReportsTestCase):
+    def setUp(self):
+        super().setUp()
+        for target, value in (
+            ('report.utils.report_folder_id', 'folder'),
+            ('report.utils.build_report_name', 'report.pdf'),
+            ('report.gapi.result_update', {}),
+            ('report.gapi.write_results', None),
+        ):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('report.tasks.upload_report_file',
+                             side_effect=lambda report, *args: f'file-{report.id}')
+        self.upload = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def approve(self, reports):
+        # the same as the bulk approve action of the admin
+        Report.objects.filter(id__in=[x.id for x in reports]).update(approved_at=timezone.now())
+        for report in reports:
+            report.refresh_from_db()
+        tasks.schedule_publication(reports, need_score=True)
+        return [x.id for x in reports], [x.publish_key for x in reports]
+
+    def test_rejected_report_is_not_published(self):
+        approved = self.create_report('approved', {'main.cpp': 'int a;'})
+        rejected = self.create_report('rejected', {'main.cpp': 'int b;'})
+        args = self.approve([approved, rejected])
+
+        # rejected before the worker runs, the same as the reject button of the admin
+        rejected.approved_at, rejected.rejected_at = None, timezone.now()
+        tasks.cancel_publication(rejected)
+        rejected.save()
+
+        result = tasks.publish_reports.apply(args=(*args, True)).get()
+
+        self.assertEqual(result['published'], [approved.id])
+        self.assertEqual([call.args[0].id for call in self.upload.call_args_list], [approved.id])
+        approved.refresh_from_db()
+        rejected.refresh_from_db()
+        self.assertEqual((approved.publish_status, approved.drive_file_id),
+                         (Report.PUBLISH_DONE, f'file-{approved.id}'))
+        self.assertEqual((rejected.publish_status, rejected.drive_file_id), ('', ''))
+
+    def test_published_report_is_skipped(self):
+        report = self.create_report('student', {'main.cpp': 'int a;'})
+        args = self.approve([report])
+
+        tasks.publish_reports.apply(args=(*args, True)).get()
+        result = tasks.publish_reports.apply(args=(*args, True)).get()
+
+        self.assertEqual(result['published'], [])
+        self.assertEqual(self.upload.call_count, 1)
+
+
+class ApproveAndPublishActionTestCase(ReportsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_login(self.admin)
+        self.reports = [self.create_report(f'student{i}', {'main.cpp': f'int a{i};'}) for i in range(2)]
+
+    def test_reject_after_bulk_approve(self):
+        response = self.client.post(reverse('admin:report_report_changelist'), {
+            'action': 'approve_and_publish',
+            '_selected_action': [x.id for x in self.reports],
+        }, follow=True)
+        self.assertContains(response, '&quot;publication&quot; column')
+        self.assertEqual(
+            set(Report.objects.values_list('publish_status', flat=True)), {Report.PUBLISH_PENDING}
+        )
+
+        request = RequestFactory().post('/', {'_reject': 'Reject'})
+        request.user, request.session = self.admin, {}
+        request._messages = FallbackStorage(request)
+        rejected = Report.objects.get(id=self.reports[0].id)
+        ReportAdmin(Report, admin.site).response_change(request, rejected)
+
+        rejected.refresh_from_db()
+        self.assertIsNone(rejected.approved_at)
+        self.assertEqual((rejected.publish_key, rejected.publish_status), ('', ''))
+
+
+@override_settings(SKELETON_MIN_LINES=2)
+class SkeletonTestCase(SimpleTestCase):
+    @staticmethod
+    def skeleton(*texts: str) -> utils.Skeleton:
+        return utils.Skeleton(tuple(
+            tuple(fingerprints.line_fingerprint(line) for line in text.splitlines()) for text in texts
+        ))
+
+    @staticmethod
+    def removed(text: str, skeleton: utils.Skeleton) -> list:
+        lines = text.split('\n')
+        return [line for line, matched in zip(lines, utils.skeleton_mask(lines, skeleton)) if matched]
+
+    def test_runs_of_lines(self):
+        skeleton = self.skeleton('#include <iostream>\nusing namespace std;\nint main() {\n    return 0;\n}')
+        source = ('#include <iostream>\nusing namespace std;\nint f() {\n  return 1;\n}\n'
+                  'int main() {\n  int a = f();\n  return 0;\n}')
+        # single aligned lines ("int main() {") are kept, like "}" of the student function
+        self.assertEqual(self.removed(source, skeleton),
+                         ['#include <iostream>', 'using namespace std;', '  return 0;', '}'])
+
+    def test_common_lines_are_kept(self):
+        skeleton = self.skeleton('int main() {\n    return 0;\n}')
+        source = '}\n}\nreturn 0;\nint x;\nreturn 0;\n}'
+        self.assertEqual(self.removed(source, skeleton), ['return 0;', '}'])
+
+    def test_blank_lines_are_skipped(self):
+        skeleton = self.skeleton('int read();\nint write();')
+        source = 'int read();\n\n   \nint write();\nint main();'
+        self.assertEqual(self.removed(source, skeleton), ['int read();', 'int write();'])
+
+    def test_several_files(self):
+        skeleton = self.skeleton('int read();\nint write();', 'class A {\n};')
+        source = 'class A {\n};\nint main();\nint read();\nint write();'
+        self.assertEqual(self.removed(source, skeleton),
+                         ['class A {', '};', 'int read();', 'int write();'])
+
+    @override_settings(SKELETON_MIN_LINES=3)
+    def test_min_lines(self):
+        skeleton = self.skeleton('int read();\nint write();')
+        self.assertEqual(self.removed('int read();\nint write();', skeleton), [])
+
+    def test_subtract_skeleton(self):
+        skeleton = self.skeleton('int read();\nint write();')
+        lines = ['int main();', 'int read();', 'int write();']
+        self.assertEqual(utils.subtract_skeleton(lines, ['a', 'b', 'c'], skeleton), ['a'])
+        self.assertEqual(utils.subtract_skeleton(lines, lines, utils.Skeleton()), lines)
+
+
+@override_settings(SIMILARITY_TOP_K=2)
+class StoreNeighboursTestCase(ReportsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reports = [self.create_report(f'student{i}', {'main.cpp': f'int a{i};'}) for i in range(5)]
+
+    def neighbours(self, report: Report) -> list:
+        return list(ReportsSimilarity.objects.filter(right=report).values_list('left_id', 'ratio'))
+
+    def test_top_k_are_stored(self):
+        report, *others = self.reports
+        utils.store_neighbours(report.id, [(0.9, others[0].id, False), (0.5, others[1].id, False),
+                                           (0.1, others[2].id, False)])
+        self.assertEqual(self.neighbours(report), [(others[0].id, 0.9), (others[1].id, 0.5)])
+
+        # neighbours are replaced by the next check
+        utils.store_neighbours(report.id, [(0.3, others[3].id, True)])
+        self.assertEqual(self.neighbours(report), [(others[3].id, 0.3)])
+
+    def test_neighbour_is_added_to_top_k(self):
+        report, *others = self.reports
+        utils.store_neighbours(report.id, [(0.9, others[0].id, False), (0.5, others[1].id, False)])
+
+        utils.add_neighbour(report.id, others[2].id, 0.1)
+        self.assertEqual(self.neighbours(report), [(others[0].id, 0.9), (others[1].id, 0.5)])
+
+        utils.add_neighbour(report.id, others[3].id, 0.7, approximate=True)
+        self.assertEqual(self.neighbours(report), [(others[0].id, 0.9), (others[3].id, 0.7)])
+
+        # the ratio of the already stored neighbour is updated
+        utils.add_neighbour(report.id, others[0].id, 0.2)
+        self.assertEqual(self.neighbours(report), [(others[3].id, 0.7), (others[0].id, 0.2)])
+
+    def test_similarity_is_stored_from_both_sides(self):
+        old, other, new = self.reports[:3]
+        utils.store_neighbours(old.id, [(0.8, other.id, False), (0.6, self.reports[3].id, False)])
+
+        utils.store_similarity(new.id, [(0.7, old.id, False), (0.3, other.id, False)],
+                               [(0.65, old.id, False), (0.2, other.id, True)])
+        self.assertEqual(self.neighbours(new), [(old.id, 0.7), (other.id, 0.3)])
+        self.assertEqual(self.neighbours(old), [(other.id, 0.8), (new.id, 0.65)])
+        self.assertEqual(self.neighbours(other), [(new.id, 0.2)])
+        new.refresh_from_db()
+        self.assertIsNotNone(new.similarity_checked_at)
+
+
+class DiffHunksTestCase(ReportsTestCase):
+    @staticmethod
+    def random_lines(rng: random.Random, count: int) -> list:
+        return [rng.choice(('int a;', 'int b;', 'return 0;', '}', '')) for _ in range(count)]
+
+    def test_groups_as_difflib(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            left = self.random_lines(rng, rng.randrange(40))
+            right = self.random_lines(rng, rng.randrange(40))
+            matcher = df.SequenceMatcher(None, left, right)
+            for n in (0, 1, 3):
+                with self.subTest(left=left, right=right, n=n):
+                    self.assertEqual(utils.group_opcodes(matcher.get_opcodes(), n),
+                                     list(matcher.get_grouped_opcodes(n)))
+
+    def test_hunks(self):
+        left = [f'line {i}' for i in range(20)]
+        right = left[:5] + ['new'] + left[6:15] + left[16:] + ['tail']
+        matcher = df.SequenceMatcher(None, left, right)
+        hunks = utils.diff_hunks('\n'.join(left), '\n'.join(right), matcher.get_opcodes(), 1)
+
+        self.assertEqual(hunks, [
+            [['equal', 5, 'line 4', 5, 'line 4'],
+             ['replace', 6, 'line 5', 6, 'new'],
+             ['equal', 7, 'line 6', 7, 'line 6']],
+            [['equal', 15, 'line 14', 15, 'line 14'],
+             ['delete', 16, 'line 15', None, ''],
+             ['equal', 17, 'line 16', 16, 'line 16']],
+            [['equal', 20, 'line 19', 19, 'line 19'],
+             ['insert', None, '', 20, 'tail']],
+        ])
+
+    def test_opcodes_of_source_files(self):
+        left = self.create_report('left', {'main.cpp': 'int a;\nint b;\n'}).source_files.get()
+        right = self.create_report('right', {'main.cpp': 'int a;\nint c;\n'}).source_files.get()
+        expected = df.SequenceMatcher(None, ['int a;', 'int b;'], ['int a;', 'int c;']).get_opcodes()
+
+        self.assertEqual(list(map(tuple, utils.diff_opcodes(left, right))), expected)
+        with override_settings(SIMILARITY_MAX_EXACT_SIZE=5):
+            self.assertIsNone(utils.diff_opcodes(left, right))
+
+
+class SheetLayoutTestCase(ReportsTestCase):
+    # values of ranges A4:A50 and C1:Y3 of the group tab
+    STUDENTS = [['Ivanov Ivan'], [], ['Petrov Petr'], ['']]
+    HEADER = [
+        ['01.09.2020 - 14.09.2020', '', '', 'no deadline'],
+        ['Task 1', '', '', 'Task 2', '', '', ''],
+        ['', '', 'max 10', '', '', ''],
+    ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch.object(gapi, 'services')
+        self.services = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.batch_get = self.services.sheets.spreadsheets.return_value.values.return_value.batchGet
+        self.batch_get.return_value.execute.return_value = {
+            'valueRanges': [{'values': self.STUDENTS}, {'values': self.HEADER}]
+        }
+
+    def test_layout(self):
+        layout = gapi.load_sheet_layout('sheet', 'Group-1')
+
+        self.batch_get.assert_called_once_with(spreadsheetId='sheet', ranges=['Group-1!A4:A50', 'Group-1!C1:Y3'])
+        self.assertEqual(layout.students, [('Ivanov Ivan', 4), ('Petrov Petr', 6)])
+        self.assertEqual(layout.tasks, [('Task 1', 3), ('Task 2', 6)])
+        self.assertEqual(layout.deadlines, {
+            3: timezone.make_aware(timezone.datetime(2020, 9, 15)),
+            6: None,
+        })
+        self.assertEqual(layout.scores, {3: 10, 6: None})
+        self.assertEqual(layout.find_row('Petrov'), 6)
+        self.assertIsNone(layout.find_row('Sidorov'))
+        self.assertEqual(layout.find_column('2'), 6)
+        self.assertIsNone(layout.find_column('3'))
+
+    def test_empty_tab(self):
+        self.batch_get.return_value.execute.return_value = {'valueRanges': [{}, {}]}
+        self.assertEqual(gapi.load_sheet_layout('sheet', 'Group-1'), gapi.SheetLayout([], [], {}, {}))
+
+    def test_layout_is_cached_by_group_version(self):
+        Group.objects.create(title='Group-1')
+        gapi.get_sheet_layout('sheet', 'Group-1')
+        gapi.get_sheet_layout('sheet', 'Group-1')
+        self.assertEqual(self.batch_get.call_count, 1)
+
+        gapi.invalidate_sheet_layout('sheet', 'Group-1')
+        self.assertEqual(Group.objects.get(title='Group-1').sheet_layout_version, 1)
+        gapi.get_sheet_layout('sheet', 'Group-1')
+        self.assertEqual(self.batch_get.call_count, 2)
+
+    def test_result_update(self):
+        report = self.create_report('petrov', {'main.cpp': 'int a;'})
+        User.objects.filter(id=report.user_id).update(first_name='Petr', last_name='Petrov')
+        Group.objects.create(title='Group-1').users.add(report.user)
+        # two weeks after the deadline
+        Report.objects.filter(id=report.id).update(
+            created_at=timezone.make_aware(timezone.datetime(2020, 9, 29, 12))
+        )
+        report.refresh_from_db()
+
+        self.assertEqual(gapi.result_update('sheet', report, 'url'), {
+            'range': 'Group-1!R6C3:R6C5',
+            'majorDimension': 'ROWS',
+            'values': [['29.09.2020', 'url', 8]],
+        })
+
+        report.task = Task.objects.create(number=3, title='Task', description='Task')
+        with self.assertRaisesMessage(RuntimeError, 'Task with number "3" not found'):
+            gapi.result_update('sheet', report, 'url')
+        # the layout is reloaded before the error
+        self.assertEqual(self.batch_get.call_count, 2)
+
+
+class WarmUpPdfRendererTestCase(SimpleTestCase):
+    def warm_up(self, queues: list) -> bool:
+        with mock.patch('report.tasks.current_app') as app, mock.patch('report.rendering.warm_up') as warm_up:
+            app.amqp.queues.consume_from = {name: mock.Mock() for name in queues}
+            tasks.warm_up_pdf_renderer()
+        return warm_up.called
+
+    @override_settings(PDF_QUEUE='pdf')
+    def test_only_pdf_workers(self):
+        self.assertTrue(self.warm_up(['pdf']))
+        self.assertTrue(self.warm_up(['celery', 'pdf']))
+        self.assertFalse(self.warm_up(['celery']))
@@ -2,7 +2,8 @@ from django.urls import path
 
 from .views import (
     SendReportView, TasksView, ReportsView,
-    pdf_task_view, report_view, pdf_report_view, reports_comparator_view,
+    pdf_task_view, report_view, pdf_report_view, reports_comparator_view, reports_diff_view,
+    reports_export_view,
 )
 
 urls = [
@@ -13,4 +14,6 @@ urls = [
     path('report/<int:rid>/', report_view, name='report'),
     path('report/<int:rid>/pdf/', pdf_report_view, name='pdf_report'),
     path('report/comparator/<int:tid>/', reports_comparator_view, name='reports_comparator'),
+    path('report/comparator/<int:tid>/diff/', reports_diff_view, name='reports_diff'),
+    path('report/export/', reports_export_view, name='reports_export'),
 ]
@@ -1,25 +1,34 @@
+import hashlib
+import html
+import re
 import secrets
 import difflib as df
 
 import typing
-from os.path import basename
+from os.path import basename, isfile, splitext
 
 from django.conf import settings
-from django.template.loader import render_to_string
-from weasyprint import HTML
-
-from report.models import Report, Task, SourceFile
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q, QuerySet
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from report import fingerprints, gapi, lexer, rendering, similarity
+from report.models import (
+    Report, Task, SourceFile, SourceFileFingerprint, ReportsSimilarity,
+    ReportSignature, ReportLshBucket, TaskSkeletonFile, GoogleApiFolder,
+)
 
 ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ'
 ALPHABET = ALPHABET + ALPHABET.lower() + 'L' + '23456789'
 
-
-def build_pdf(html: str, **kwargs):
-    return HTML(string=html, **kwargs).render().write_pdf()
+SIMILARITY_MODES = 'raw', 'tokens',
+HUGE_FILES_NOTE = 'файлы слишком большие, коэффициент похожести вычислен приближённо'
 
 
 def build_pdf_by_template(template: str, context: dict, **kwargs):
-    return build_pdf(render_to_string(template, context=context), **kwargs)
+    return rendering.render_pdf_template(template, context, **kwargs)
 
 
 def build_report_pdf(report: Report, **kwargs):
@@ -30,61 +39,266 @@ def build_task_pdf(task: Task, **kwargs):
     return build_pdf_by_template('report/pdf_task_template.html', {'task': task}, **kwargs)
 
 
+def task_html_digest(task: Task) -> str:
+    html = rendering.render_html('report/pdf_task_template.html', {'task': task})
+    return hashlib.sha256(html.encode()).hexdigest()
+
+
 def gen_pass(length: int = 14) -> str:
     password = ''.join(secrets.choice(ALPHABET) for _ in range(length))
     return password
 
 
-def match_files_by_ratio(src: Report, dst: Report) -> (list, dict, dict):
-    files_names = {}
-    files_contents = {}
-    ratio_pairs = []
-
-    for f1 in src.source_files.all():  # type: SourceFile
-        f1_content = files_contents.setdefault(f1.id, f1.file.read())
-        f1_name = files_names.setdefault(f1.id, basename(f1.file.name))
-
-        for f2 in dst.source_files.all():  # type: SourceFile
-            f2_content = files_contents.setdefault(f2.id, f2.file.read())
-            f2_name = files_names.setdefault(f2.id, basename(f2.file.name))
-
-            ratio = df.SequenceMatcher(None, f1_content, f2_content).ratio()
-
-            is_same_names = f1_name == f2_name  # TODO: make with distance
-
-            ratio_pairs.append((is_same_names, ratio, f1.id, f2.id))
-
-            if is_same_names:
-                break
-
-    ratio_pairs.sort(reverse=True)
-
-    matched_files = []
-    while ratio_pairs:
-        _, ratio, left, right = ratio_pairs.pop(0)
-        matched_files.append((ratio, left, right))
-        ratio_pairs = list(filter(lambda x: x[2] != left and x[3] != right, ratio_pairs))
-
+def decode_source(content: bytes) -> str:
+    return content.decode(errors='ignore')
+
+
+def normalize_source(content: bytes) -> str:
+    lines = (
+        line.expandtabs(4).rstrip()
+        for line in decode_source(content).splitlines()
+    )
+    return '\n'.join(line for line in lines if line)
+
+
+def fill_source_file_cache(f: SourceFile) -> None:
+    # a new upload isn't committed yet and has the original file name
+    if not f.name or not f.file._committed:
+        f.name = get_valid_filename(basename(f.file.name))
+
+    f.file.open('rb')
+    content = f.file.read()
+    f.file.seek(0)
+
+    f.digest = hashlib.sha256(content).hexdigest()
+    f.size = len(content)
+    f.lines_count = len(content.splitlines())
+    f.text = decode_source(content)
+    f.normalized = normalize_source(content)
+    f.tokens = '\n'.join(lexer.tokenize_lines(f.normalized, splitext(f.name)[-1]))
+
+
+def load_source_files(report: Report) -> typing.List[SourceFile]:
+    files = list(report.source_files.all())
+    for f in files:  # type: SourceFile
+        if not f.digest or (f.size and not f.text):
+            fill_source_file_cache(f)
+            f.save(update_fields=('name', 'digest', 'size', 'lines_count', 'text', 'normalized', 'tokens'))
+    return files
+
+
+class Skeleton(typing.NamedTuple):
+    # fingerprints of lines of every skeleton file in order
+    lines: typing.Tuple[typing.Tuple[int, ...], ...] = ()
+    fingerprints: typing.FrozenSet[int] = frozenset()
+    digest: str = ''
+
+
+def fill_skeleton_file_cache(skeleton_file: TaskSkeletonFile) -> None:
+    skeleton_file.file.open('rb')
+    content = skeleton_file.file.read()
+    skeleton_file.file.seek(0)
+
+    normalized = normalize_source(content)
+    skeleton_file.digest = hashlib.sha256(content).hexdigest()
+    skeleton_file.lines = [fingerprints.line_fingerprint(line) for line in normalized.splitlines()]
+    skeleton_file.fingerprints = sorted(fingerprints.winnow(
+        normalized.encode(), settings.FINGERPRINT_KGRAM, settings.FINGERPRINT_WINDOW
+    ))
+
+
+def task_skeleton(task_id: int) -> Skeleton:
+    lines, prints, digests = [], set(), []
+    for x in TaskSkeletonFile.objects.filter(task_id=task_id).order_by('id'):
+        if not x.digest:
+            fill_skeleton_file_cache(x)
+            x.save(update_fields=('digest', 'lines', 'fingerprints'))
+        lines.append(tuple(x.lines))
+        prints.update(x.fingerprints)
+        digests.append(x.digest)
+    return Skeleton(tuple(lines), frozenset(prints), ' '.join(digests))
+
+
+def skeleton_mask(lines: typing.List[str], skeleton: Skeleton) -> typing.List[bool]:
+    """
+    Flags of lines of the source matched to the skeleton: runs of at least SKELETON_MIN_LINES
+    lines aligned with consecutive lines of a skeleton file (blank lines are skipped)
+    """
+    indexes = [i for i, line in enumerate(lines) if line.strip()]
+    prints = [fingerprints.line_fingerprint(lines[i]) for i in indexes]
+
+    matched = [False] * len(lines)
+    for skeleton_lines in skeleton.lines:
+        rest = [k for k in range(len(indexes)) if not matched[indexes[k]]]
+        matcher = df.SequenceMatcher(None, [prints[k] for k in rest], skeleton_lines, autojunk=False)
+        for a, _, size in matcher.get_matching_blocks():
+            if size >= settings.SKELETON_MIN_LINES:
+                for k in rest[a:a + size]:
+                    matched[indexes[k]] = True
+    return matched
+
+
+def subtract_skeleton(lines: typing.List[str], content: typing.List[str],
+                      skeleton: Skeleton) -> typing.List[str]:
+    """
+    Items of content (aligned with lines of the source) except the lines matched to the skeleton
+    """
+    return [x for x, skip in zip(content, skeleton_mask(lines, skeleton)) if not skip]
+
+
+def file_data(f: SourceFile, mode: str = None, skeleton: Skeleton = None) -> similarity.FileData:
+    """
+    "raw" content is the original text, "tokens" content is the sequence of lines of tokens,
+    so every line is compared as a single symbol
+    """
+    mode = mode or settings.SIMILARITY_MODE
+    if mode == 'tokens':
+        lines, content = f.normalized.split('\n'), f.tokens.split('\n')
+    else:
+        lines = content = f.text.split('\n')
+
+    if skeleton and skeleton.lines:
+        content = subtract_skeleton(lines, content, skeleton)
+
+    if mode == 'tokens':
+        content = [x for x in content if x]
+    else:
+        content = '\n'.join(content)
+    return similarity.FileData(f.id, f.name, content, f.digest)
+
+
+def source_files_data(report: Report, mode: str = None,
+                      skeleton: Skeleton = None) -> typing.List[similarity.FileData]:
+    """
+    Data of report files for comparison, lines of the task skeleton are removed
+    """
+    if skeleton is None:
+        skeleton = task_skeleton(report.task_id)
+    return [file_data(f, mode, skeleton) for f in load_source_files(report)]
+
+
+def similarity_options(mode: str = None) -> similarity.MatchOptions:
+    mode = mode or settings.SIMILARITY_MODE
+    return similarity.MatchOptions(
+        cutoff=settings.SIMILARITY_FILE_CUTOFF,
+        # lines of tokens are few distinct symbols, the junk heuristic would drop all of them
+        autojunk=mode != 'tokens',
+        max_exact_size=settings.SIMILARITY_MAX_EXACT_LINES if mode == 'tokens'
+        else settings.SIMILARITY_MAX_EXACT_SIZE,
+        time_budget=settings.SIMILARITY_TIME_BUDGET,
+        kgram=settings.FINGERPRINT_KGRAM,
+        window=settings.FINGERPRINT_WINDOW,
+    )
+
+
+def match_files_by_ratio(src: Report, dst: Report, mode: str = None) -> (list, dict, dict):
+    src_files = load_source_files(src)
+    dst_files = load_source_files(dst)
+
+    files_names = {f.id: f.name for f in src_files + dst_files}
+    files_contents = {f.id: f.text for f in src_files + dst_files}
+
+    src_skeleton, dst_skeleton = task_skeleton(src.task_id), task_skeleton(dst.task_id)
+    matched_files = similarity.match_files(
+        [file_data(f, mode, src_skeleton) for f in src_files],
+        [file_data(f, mode, dst_skeleton) for f in dst_files],
+        similarity_options(mode)
+    )
     return matched_files, files_names, files_contents
 
 
-def ratio_reports(src: Report, dst: Report) -> float:
-    matched_files, _, files_contents = match_files_by_ratio(src, dst)
-
-    ratios = sum((ratio * len(files_contents[fid1]) for ratio, fid1, _ in matched_files))
-    return ratios / sum((len(files_contents[fid1]) for _, fid1, _ in matched_files))
-
-
-def compare_reports(src: Report, dst: Report) -> typing.List[typing.Tuple[float, str]]:
-    matched_files, files_names, files_contents = match_files_by_ratio(src, dst)
-
+def ratio_reports(src: Report, dst: Report, mode: str = None) -> float:
+    return similarity.ratio_files(
+        source_files_data(src, mode), source_files_data(dst, mode), similarity_options(mode)
+    )
+
+
+def comparison_key(src_files: typing.List[SourceFile], dst_files: typing.List[SourceFile],
+                   src: Report, dst: Report, mode: str, skeletons: typing.List[Skeleton]) -> str:
+    digests = hashlib.sha256('|'.join((
+        ' '.join(f.digest for f in src_files), ' '.join(f.digest for f in dst_files),
+        *(x.digest for x in skeletons)
+    )).encode()).hexdigest()
+    return f'comparison:v3:{mode}:{src.id}:{dst.id}:{digests}'
+
+
+def comparison(src: Report, dst: Report, mode: str = None) -> dict:
+    """
+    Matched files of reports with ratios, cached by reports and digests of their files
+    """
+    mode = mode or settings.SIMILARITY_MODE
+    src_files = load_source_files(src)
+    dst_files = load_source_files(dst)
+
+    src_skeleton, dst_skeleton = task_skeleton(src.task_id), task_skeleton(dst.task_id)
+
+    cache = caches['comparisons']
+    key = comparison_key(src_files, dst_files, src, dst, mode, [src_skeleton, dst_skeleton])
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    src_data = [file_data(f, mode, src_skeleton) for f in src_files]
+    dst_data = [file_data(f, mode, dst_skeleton) for f in dst_files]
+    matched_files = similarity.match_files(src_data, dst_data, similarity_options(mode))
+
+    files = {f.id: f for f in src_files + dst_files}
+    result = {
+        'ratio': similarity.weighted_ratio(matched_files, {f.id: len(f.content) for f in src_data}),
+        'approximate': any(x.approximate for x in matched_files),
+        'files': [
+            {
+                'ratio': x.ratio,
+                'approximate': x.approximate,
+                'left': x.left,
+                'right': x.right,
+                'left_name': files[x.left].name,
+                'right_name': files[x.right].name,
+            }
+            for x in matched_files
+        ],
+    }
+    cache.set(key, result, settings.COMPARISON_CACHE_TIMEOUT)
+    return result
+
+
+def diff_opcodes(left: SourceFile, right: SourceFile) -> typing.Optional[typing.List[tuple]]:
+    """
+    Diff opcodes of lines of the original files, cached by digests of the files.
+    Diff of huge files is not built (None)
+    """
+    if max(len(left.text), len(right.text)) > settings.SIMILARITY_MAX_EXACT_SIZE:
+        return None
+
+    cache = caches['comparisons']
+    key = f'diff:{left.digest}:{right.digest}'
+    opcodes = cache.get(key)
+    if opcodes is None:
+        opcodes = df.SequenceMatcher(
+            None, left.text.splitlines(), right.text.splitlines()
+        ).get_opcodes()
+        cache.set(key, opcodes, settings.COMPARISON_CACHE_TIMEOUT)
+    return opcodes
+
+
+def compare_reports(src: Report, dst: Report,
+                    mode: str = None) -> typing.List[typing.Tuple[float, str]]:
+    matched_files = comparison(src, dst, mode)['files']
+    files = SourceFile.objects.in_bulk(
+        [x['left'] for x in matched_files] + [x['right'] for x in matched_files]
+    )
+
+    # names are put into html as is
     compared = [
-        (ratio, df.HtmlDiff(tabsize=4).make_file(
-            files_contents[fid1].decode().splitlines(),
-            files_contents[fid2].decode().splitlines(),
-            files_names[fid1], files_names[fid2]
+        (x['ratio'], df.HtmlDiff(tabsize=4).make_file(
+            files[x['left']].text.splitlines(),
+            files[x['right']].text.splitlines(),
+            html.escape(x['left_name']), html.escape(x['right_name'])
         ))
-        for ratio, fid1, fid2 in matched_files
+        if not x['approximate'] else
+        (x['ratio'], f'{html.escape(x["left_name"])} &harr; {html.escape(x["right_name"])}: '
+                     f'{HUGE_FILES_NOTE}')
+        for x in matched_files
     ]
 
     # TODO: add to compared added and removed files
@@ -92,6 +306,254 @@ def compare_reports(src: Report, dst: Report) -> typing.List[typing.Tuple[float,
     return compared
 
 
+def group_opcodes(opcodes: typing.List[tuple], n: int = 3) -> typing.List[typing.List[tuple]]:
+    """
+    Same as difflib.SequenceMatcher.get_grouped_opcodes but for precomputed opcodes:
+    groups of changes with up to n lines of context
+    """
+    codes = [tuple(x) for x in opcodes] or [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    groups, group = [], []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > n * 2:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return groups
+
+
+def diff_hunks(left: str, right: str, opcodes: typing.List[tuple],
+               context: int = 3) -> typing.List[typing.List[list]]:
+    """
+    Changed hunks of the side-by-side diff, every line is
+    [tag, left number, left line, right number, right line]
+    """
+    left_lines, right_lines = left.splitlines(), right.splitlines()
+
+    hunks = []
+    for group in group_opcodes(opcodes, context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            for k in range(max(i2 - i1, j2 - j1)):
+                i, j = i1 + k, j1 + k
+                lines.append([
+                    tag,
+                    i + 1 if i < i2 else None, left_lines[i] if i < i2 else '',
+                    j + 1 if j < j2 else None, right_lines[j] if j < j2 else '',
+                ])
+        hunks.append(lines)
+    return hunks
+
+
+def index_report_fingerprints(report: Report) -> typing.Set[int]:
+    values = set(report.fingerprints.values_list('value', flat=True))
+    if values:
+        return values
+
+    rows = []
+    for f in load_source_files(report):  # type: SourceFile
+        file_values = fingerprints.winnow(
+            f.normalized.encode(), settings.FINGERPRINT_KGRAM, settings.FINGERPRINT_WINDOW
+        )
+        rows.extend(
+            SourceFileFingerprint(source_file=f, report=report, task_id=report.task_id, value=value)
+            for value in file_values
+        )
+        values |= file_values
+
+    SourceFileFingerprint.objects.bulk_create(rows, batch_size=1000)
+    return values
+
+
+def find_candidate_reports(report: Report, values: typing.Set[int],
+                           limit: int) -> typing.List[Report]:
+    # fingerprints of the task skeleton are shared by all reports
+    values = values - task_skeleton(report.task_id).fingerprints
+    shared = SourceFileFingerprint.objects.filter(
+        task_id=report.task_id, value__in=values
+    ).exclude(report__user_id=report.user_id).values('report_id').annotate(
+        shared=Count('value', distinct=True)
+    ).order_by('-shared')[:limit]
+
+    candidate_ids = [x['report_id'] for x in shared]
+    return list(Report.objects.filter(id__in=candidate_ids).prefetch_related('source_files'))
+
+
+def index_report_signature(report: Report, values: typing.Set[int]) -> typing.List[int]:
+    stored = ReportSignature.objects.filter(report=report).first()
+    if stored and len(stored.minhash) == settings.MINHASH_PERMUTATIONS:
+        return stored.minhash
+
+    if not values:
+        return []
+
+    signature = fingerprints.minhash(values, settings.MINHASH_PERMUTATIONS)
+    with transaction.atomic():
+        ReportSignature.objects.update_or_create(report=report, defaults={'minhash': signature})
+        ReportLshBucket.objects.filter(report=report).delete()
+        ReportLshBucket.objects.bulk_create(
+            ReportLshBucket(report=report, band=band, key=key)
+            for band, key in enumerate(fingerprints.lsh_bands(signature, settings.LSH_BANDS))
+        )
+    return signature
+
+
+def find_near_duplicate_reports(report: Report, signature: typing.List[int],
+                                limit: int) -> typing.List[Report]:
+    """
+    Find reports of other tasks sharing at least one LSH band with the signature
+    and having estimated Jaccard similarity not less than MINHASH_THRESHOLD
+    """
+    if not signature:
+        return []
+
+    query = Q()
+    for band, key in enumerate(fingerprints.lsh_bands(signature, settings.LSH_BANDS)):
+        query |= Q(band=band, key=key)
+
+    report_ids = ReportLshBucket.objects.filter(query).exclude(
+        report__task_id=report.task_id
+    ).exclude(report__user_id=report.user_id).values_list('report_id', flat=True).distinct()
+
+    estimated = sorted((
+        (fingerprints.estimate_jaccard(signature, x.minhash), x.report_id)
+        for x in ReportSignature.objects.filter(report_id__in=report_ids)
+    ), reverse=True)
+    candidate_ids = [
+        report_id for value, report_id in estimated[:limit]
+        if value >= settings.MINHASH_THRESHOLD
+    ]
+    return list(Report.objects.filter(id__in=candidate_ids).prefetch_related('source_files'))
+
+
+@transaction.atomic
+def store_neighbours(report_id: int,
+                     neighbours: typing.List[typing.Tuple[float, int, bool]]) -> None:
+    ReportsSimilarity.objects.filter(right_id=report_id).delete()
+    ReportsSimilarity.objects.bulk_create(
+        ReportsSimilarity(left_id=left_id, right_id=report_id, ratio=ratio, approximate=approximate)
+        for ratio, left_id, approximate in neighbours[:settings.SIMILARITY_TOP_K]
+    )
+
+
+def add_neighbour(report_id: int, left_id: int, ratio: float, approximate: bool = False) -> None:
+    ReportsSimilarity.objects.filter(left_id=left_id, right_id=report_id).delete()
+    ReportsSimilarity.objects.create(
+        left_id=left_id, right_id=report_id, ratio=ratio, approximate=approximate
+    )
+
+    extra_ids = list(ReportsSimilarity.objects.filter(
+        right_id=report_id
+    ).values_list('id', flat=True)[settings.SIMILARITY_TOP_K:])
+    if extra_ids:
+        ReportsSimilarity.objects.filter(id__in=extra_ids).delete()
+
+
+def mark_similarity_checked(report_ids: typing.Iterable[int]) -> None:
+    Report.objects.filter(id__in=report_ids).update(similarity_checked_at=timezone.now())
+
+
+@transaction.atomic
+def store_similarity(report_id: int, neighbours: typing.List[typing.Tuple[float, int, bool]],
+                     reverse_neighbours: typing.List[typing.Tuple[float, int, bool]]) -> None:
+    """
+    Store the best neighbours of the report and add the report itself
+    to the neighbours of the compared older reports (ratios from their side)
+    """
+    list(Report.objects.select_for_update().filter(
+        id__in=[report_id] + [other_id for _, other_id, _ in reverse_neighbours]
+    ).order_by('id').values_list('id', flat=True))
+
+    store_neighbours(report_id, neighbours)
+    for ratio, other_id, approximate in reverse_neighbours:
+        add_neighbour(other_id, report_id, ratio, approximate)
+    mark_similarity_checked([report_id])
+
+
+def filter_reports(task: int = None, group: str = None, status: str = None) -> QuerySet:
+    queryset = Report.objects.select_related('task', 'user', 'report_file').prefetch_related(
+        'source_files', 'user__student_groups'
+    ).order_by('task__number', 'user__last_name', 'user__first_name', 'id')
+    if task:
+        queryset = queryset.filter(task_id=task)
+    if group:
+        queryset = queryset.filter(user__student_groups__title=group)
+    filter_func = Report.filtered_queryset().get(status)
+    if filter_func:
+        queryset = filter_func(queryset)
+    return queryset
+
+
+def archive_name(value) -> str:
+    return re.sub(r'[\\/:*?"<>|]+', '_', str(value)).strip() or '_'
+
+
+def export_entries(reports: typing.Iterable[Report]) -> typing.Iterator[typing.Tuple[str, str]]:
+    """
+    (name in archive, path on disk) of pdf and source files of reports grouped by task and group
+    """
+    for report in reports:
+        groups = report.user.student_groups.all()
+        folder = '/'.join(map(archive_name, (
+            report.task, groups[0].title if groups else 'admin', f'{report.username} {report.id}'
+        )))
+
+        report_file = getattr(report, 'report_file', None)
+        if report_file and isfile(report_file.file.path):
+            yield f'{folder}/report.pdf', report_file.file.path
+
+        names = set()
+        for f in report.source_files.all():
+            name, ext = splitext(archive_name(f.name))
+            unique_name, n = f'{name}{ext}', 1
+            while unique_name in names:
+                unique_name, n = f'{name}_{n}{ext}', n + 1
+            names.add(unique_name)
+            if isfile(f.file.path):
+                yield f'{folder}/sources/{unique_name}', f.file.path
+
+
+def build_report_name(report: Report) -> str:
+    return f'ООП_Отчёт_{report.task.number}' \
+           f'_{report.user.last_name}_{report.user.first_name}' \
+           f'_{report.user.student_groups.first().title}.pdf'
+
+
+def report_folder_id(report: Report) -> str:
+    group = report.user.student_groups.first()
+    if not group:
+        raise RuntimeError(f'User "{report.user.get_full_name()}" '
+                           'is not associated with any group')
+    google_folder_name = f'{group.title}-Lab{report.task.number:02}'
+
+    folder = GoogleApiFolder.objects.filter(title=google_folder_name).first()
+    if not folder:
+        raise RuntimeError("GoogleApiFolder not found: report wasn't uploaded to Google Drive")
+    return folder.api_id
+
+
+def upload_report_file(report: Report, folder_id: str, name: str) -> str:
+    with report.report_file.file.open('rb') as f:
+        return gapi.upload_file(folder_id, name, f.read())
+
+
+def publication_key(report: Report, need_score: bool) -> str:
+    report_file = getattr(report, 'report_file', None)
+    return hashlib.sha256(':'.join(map(str, (
+        report.id, report.approved_at.isoformat(), report_file.file.name if report_file else '', need_score
+    ))).encode()).hexdigest()
+
+
 def is_valid_filename_ext(extension: str) -> bool:
     if not extension:
         return False
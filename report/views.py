@@ -1,14 +1,17 @@
+import typing
+
+from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, Http404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import FormView, ListView
 
 from report.forms import ReportForm
 from report.models import *
-from report import tasks, utils
+from report import archive, serving, tasks, utils
 
 
 @login_required
@@ -18,11 +21,8 @@ def pdf_report_view(request, rid):
     else:
         report = get_object_or_404(Report, pk=rid, user=request.user)
 
-    try:
-        return HttpResponse(report.report_file.file, content_type='application/pdf')
-
-    except Exception:
-        raise Http404()
+    report_file = getattr(report, 'report_file', None)
+    return serving.serve_file(request, report_file and report_file.file)
 
 
 @login_required
@@ -55,11 +55,8 @@ def pdf_task_view(request, tid: int):
 
     task = get_object_or_404(qs, pk=tid)
 
-    try:
-        return HttpResponse(task.task_file.file, content_type='application/pdf')
-
-    except Exception:
-        raise Http404()
+    task_file = getattr(task, 'task_file', None)
+    return serving.serve_file(request, task_file and task_file.file)
 
 
 class SendReportView(LoginRequiredMixin, FormView):
@@ -89,22 +86,80 @@ class SendReportView(LoginRequiredMixin, FormView):
         return reverse('report', args=(self.report_id,))
 
 
+def get_compared_reports(request, tid: int) -> (Report, Report, typing.Optional[str]):
+    report_src = get_object_or_404(Report, pk=request.GET.get('src'), task_id=tid)
+    # near-duplicates can be found in reports of other tasks
+    report_dst = get_object_or_404(Report, pk=request.GET.get('dst'))
+
+    mode = request.GET.get('mode')
+    if mode not in utils.SIMILARITY_MODES:
+        mode = None
+
+    return report_src, report_dst, mode
+
+
 @staff_member_required
 def reports_comparator_view(request, tid: int):
-    report_src_id = request.GET.get('src')
-    report_dst_id = request.GET.get('dst')
+    report_src, report_dst, mode = get_compared_reports(request, tid)
+    comparison = utils.comparison(report_src, report_dst, mode)
 
-    report_src = get_object_or_404(Report, pk=report_src_id, task_id=tid)
-    report_dst = get_object_or_404(Report, pk=report_dst_id, task_id=tid)
+    similarity = None
+    if not mode:
+        similarity = ReportsSimilarity.objects.filter(left=report_src, right=report_dst).first()
+    ratio = similarity.ratio if similarity else comparison['ratio']
 
-    ratio = utils.ratio_reports(report_src, report_dst)
-    results = utils.compare_reports(report_src, report_dst)
+    full_diff = request.GET.get('diff') == 'full'
+    results = utils.compare_reports(report_src, report_dst, mode) if full_diff else None
 
     return render(request, 'report/comparator.html', context={
         'task': get_object_or_404(Task, pk=tid),
         'reports': Report.objects.filter(task_id=tid),
         'report_src_id': report_src.id,
         'report_dst_id': report_dst.id,
+        'files': comparison['files'],
         'results': results,
+        'full_diff': full_diff,
         'ratio': ratio,
+        'modes': utils.SIMILARITY_MODES,
+        'mode': mode or settings.SIMILARITY_MODE,
+    })
+
+
+@staff_member_required
+def reports_export_view(request):
+    try:
+        task = int(request.GET.get('task') or 0)
+    except ValueError:
+        raise Http404()
+    group, status = request.GET.get('group'), request.GET.get('status')
+    reports = utils.filter_reports(task, group, status)
+
+    response = StreamingHttpResponse(
+        archive.zip_stream(utils.export_entries(reports)), content_type='application/zip'
+    )
+    filename = '_'.join(str(x) for x in ('reports', task or None, group, status) if x)
+    response['Content-Disposition'] = f'attachment; filename="{utils.archive_name(filename)}.zip"'
+    return response
+
+
+@staff_member_required
+def reports_diff_view(request, tid: int):
+    """
+    Diff of a pair of files of the compared reports, reports are not compared again
+    """
+    report_src, report_dst, _ = get_compared_reports(request, tid)
+    src_files = {f.id: f for f in utils.load_source_files(report_src)}
+    dst_files = {f.id: f for f in utils.load_source_files(report_dst)}
+
+    try:
+        left = src_files[int(request.GET.get('left'))]
+        right = dst_files[int(request.GET.get('right'))]
+    except (TypeError, ValueError, KeyError):
+        raise Http404()
+
+    opcodes = utils.diff_opcodes(left, right)
+    return JsonResponse({
+        'left_name': left.name,
+        'right_name': right.name,
+        'hunks': None if opcodes is None else utils.diff_hunks(left.text, right.text, opcodes),
     })
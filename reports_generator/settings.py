@@ -137,9 +137,38 @@ STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'static'))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
+# 'nginx' gives transfer of protected files to nginx by X-Accel-Redirect, 'django' streams them
+FILES_SERVING = os.getenv('FILES_SERVING', 'django')
+# internal nginx location with MEDIA_ROOT as alias
+NGINX_PROTECTED_URL = os.getenv('NGINX_PROTECTED_URL', '/protected/')
+
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/2')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/3')
 
+# pdf documents are rendered by a dedicated pool of workers consuming this queue
+PDF_QUEUE = os.getenv('PDF_QUEUE', 'pdf')
+CELERY_TASK_ROUTES = {
+    'report.tasks.generate_task_pdf': {'queue': PDF_QUEUE},
+    'report.tasks.generate_report_pdf': {'queue': PDF_QUEUE},
+}
+# seconds to wait for next saves of a task before generating its pdf
+TASK_PDF_DEBOUNCE = int(os.getenv('TASK_PDF_DEBOUNCE', 10))
+
+# the cache is shared by web and worker processes (debounce of pdf generation, layout of
+# the result sheet, comparisons), so it must be external to the processes.
+# Comparisons are cached by contents of files, so they can live long and are evicted as LRU
+# (configure Redis with "maxmemory-policy allkeys-lru")
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/4')
+CACHES = {
+    alias: {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': alias,
+    }
+    for alias in ('default', 'comparisons')
+}
+COMPARISON_CACHE_TIMEOUT = int(os.getenv('COMPARISON_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+
 CKEDITOR_UPLOAD_PATH = 'uploads/'
 CKEDITOR_CONFIGS = {
     'default': {
@@ -150,6 +179,13 @@ CKEDITOR_CONFIGS = {
 
 GAPI_SERVICE_ACCOUNT_FILE = os.getenv('GAPI_SERVICE_ACCOUNT_FILE')
 GAPI_RESULT_SHEET = os.getenv('GAPI_RESULT_SHEET')
+# positions of students and tasks in the result sheet are cached for this number of seconds
+GAPI_LAYOUT_CACHE_TIMEOUT = int(os.getenv('GAPI_LAYOUT_CACHE_TIMEOUT', 60 * 60))
+# threads uploading reports to Google Drive by the bulk approve action
+GAPI_UPLOAD_WORKERS = int(os.getenv('GAPI_UPLOAD_WORKERS', 8))
+# publication of approved reports is retried with delays growing twice from PUBLISH_RETRY_DELAY seconds
+PUBLISH_MAX_RETRIES = int(os.getenv('PUBLISH_MAX_RETRIES', 5))
+PUBLISH_RETRY_DELAY = int(os.getenv('PUBLISH_RETRY_DELAY', 10))
 
 BLACKLIST_FILE_EXTENSIONS = [
     # images
@@ -167,4 +203,33 @@ BLACKLIST_FILE_EXTENSIONS = [
 
 BASE_URL = os.getenv('BASE_URL', 'http://localhost:8000')
 
+# media and static files of BASE_URL are read by the pdf renderer from disk, count of cached files
+PDF_ASSETS_CACHE_SIZE = int(os.getenv('PDF_ASSETS_CACHE_SIZE', 256))
+
+# similarity search
+FINGERPRINT_KGRAM = int(os.getenv('FINGERPRINT_KGRAM', 20))
+FINGERPRINT_WINDOW = int(os.getenv('FINGERPRINT_WINDOW', 10))
+SIMILARITY_CANDIDATES = int(os.getenv('SIMILARITY_CANDIDATES', 10))
+SIMILARITY_TOP_K = int(os.getenv('SIMILARITY_TOP_K', 5))
+# "raw" compares the original text of sources, "tokens" compares lines of lexed tokens
+# (renamed identifiers are not noticed, but unrelated sources get higher ratios)
+SIMILARITY_MODE = os.getenv('SIMILARITY_MODE', 'raw')
+SIMILARITY_WORKERS = int(os.getenv('SIMILARITY_WORKERS', 1))
+# pairs of files which surely have lower ratio are not compared exactly and scored as 0
+SIMILARITY_FILE_CUTOFF = float(os.getenv('SIMILARITY_FILE_CUTOFF', 0.1))
+# files longer than max size (in chars for "raw" mode, in lines for "tokens" mode)
+# are compared approximately by fingerprints
+SIMILARITY_MAX_EXACT_SIZE = int(os.getenv('SIMILARITY_MAX_EXACT_SIZE', 100_000))
+SIMILARITY_MAX_EXACT_LINES = int(os.getenv('SIMILARITY_MAX_EXACT_LINES', 5_000))
+# seconds for a comparison of two files, slower exact comparisons fall back to fingerprints
+SIMILARITY_TIME_BUDGET = float(os.getenv('SIMILARITY_TIME_BUDGET', 5.0))
+# runs of at least this number of lines matching consecutive lines of a skeleton file
+# are removed from source files before scoring
+SKELETON_MIN_LINES = int(os.getenv('SKELETON_MIN_LINES', 2))
+# near-duplicates search across all tasks: bands * rows = permutations,
+# threshold is the minimal estimated Jaccard similarity of fingerprints
+MINHASH_PERMUTATIONS = int(os.getenv('MINHASH_PERMUTATIONS', 128))
+LSH_BANDS = int(os.getenv('LSH_BANDS', 32))
+MINHASH_THRESHOLD = float(os.getenv('MINHASH_THRESHOLD', 0.5))
+
 AdminSite.site_header = 'Reports generator'